@@ -0,0 +1,233 @@
+import io
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, NamedTuple, Optional
+
+import chess
+import chess.engine
+import chess.pgn
+
+from engine_pool import POOL_SIZE, get_pool
+from game import BOT_ENGINE_PATHS, MATE_SCORE, SEARCH_WORKERS, minmax_move, remember_minmax_move
+from metrics import record_search
+
+
+ANALYSIS_PROCESSES = int(os.environ.get("PYCHESS_ANALYSIS_PROCESSES", str(os.cpu_count() or 2)))
+ANALYSIS_MAX_POSITIONS = int(os.environ.get("PYCHESS_ANALYSIS_MAX_POSITIONS", "2000"))
+ANALYSIS_MAX_BATCHES = int(os.environ.get("PYCHESS_ANALYSIS_MAX_BATCHES", "4"))
+ANALYSIS_TIME = float(os.environ.get("PYCHESS_ANALYSIS_TIME", "0.1"))
+ANALYSIS_MAX_TIME = float(os.environ.get("PYCHESS_ANALYSIS_MAX_TIME", "5"))
+ANALYSIS_BUDGET = float(os.environ.get("PYCHESS_ANALYSIS_BUDGET", "60"))
+ANALYSIS_MAX_BUDGET = float(os.environ.get("PYCHESS_ANALYSIS_MAX_BUDGET", "600"))
+
+ANALYSIS_BOT_TYPES = ("minmax",) + tuple(BOT_ENGINE_PATHS)
+
+
+class AnalysisBusy(Exception):
+    pass
+
+
+class Position(NamedTuple):
+    fen: str
+    # Where the position came from in a PGN: game number, ply and the move played there.
+    game: Optional[int] = None
+    ply: Optional[int] = None
+    played: Optional[str] = None
+
+
+def positions_from_fens(fens: List[str], limit: int = ANALYSIS_MAX_POSITIONS) -> List[Position]:
+    if len(fens) > limit:
+        raise ValueError(f"At most {limit} positions per batch.")
+    positions = []
+    for fen in fens:
+        # Raises ValueError for a malformed FEN before any work is queued.
+        positions.append(Position(chess.Board(fen).fen()))
+    return positions
+
+
+# Every position in the main line of every game, each with the move that was played from it.
+def positions_from_pgn(pgn: str, limit: int = ANALYSIS_MAX_POSITIONS) -> List[Position]:
+    positions = []
+    handle = io.StringIO(pgn)
+    number = 0
+    while True:
+        parsed = chess.pgn.read_game(handle)
+        if parsed is None:
+            break
+        if parsed.errors:
+            raise ValueError(f"Game {number + 1}: {parsed.errors[0]}")
+        board = parsed.board()
+        for ply, move in enumerate(parsed.mainline_moves()):
+            positions.append(Position(board.fen(), number, ply, board.san(move)))
+            board.push(move)
+        number += 1
+        if len(positions) > limit:
+            raise ValueError(f"At most {limit} positions per batch.")
+    if not number:
+        raise ValueError("No games found in the PGN.")
+    return positions
+
+
+def white_score(score: Optional[int], turn: chess.Color) -> Optional[int]:
+    if score is None:
+        return None
+    return score if turn == chess.WHITE else -score
+
+
+# Runs in an analysis worker: a process for minmax, a thread for UCI engines. Scores are
+# from white's side, as engines report them.
+def analyse_fen(fen: str, bot_type: str, think_time: float) -> dict:
+    board = chess.Board(fen)
+    outcome = board.outcome()
+    if outcome is not None:
+        return {"move": None, "result": outcome.result(), "termination": outcome.termination.name.lower()}
+    limit = chess.engine.Limit(time=think_time)
+    if bot_type == "minmax":
+        # No book: a book move comes without a score, which is what analysis is for.
+        result = minmax_move(board, limit, None)
+        return {"move": result.move.uci(), "san": board.san(result.move), "score": white_score(result.score, board.turn),
+                "depth": result.depth, "nodes": result.nodes, "search": result}
+    with get_pool(BOT_ENGINE_PATHS[bot_type]).engine() as engine:
+        info = engine.analyse(board, limit)
+    pv = info.get("pv") or []
+    if not pv:
+        raise RuntimeError("Engine returned no move.")
+    score = info.get("score")
+    return {"move": pv[0].uci(), "san": board.san(pv[0]),
+            "score": score.white().score(mate_score=MATE_SCORE) if score else None,
+            "depth": info.get("depth"), "nodes": info.get("nodes"),
+            "pv": [move.uci() for move in pv]}
+
+
+# Analyses batches of positions on executors of its own, so offline work never queues
+# behind the bot moves of live games.
+class Analyzer:
+    def __init__(self, processes: int = ANALYSIS_PROCESSES, max_batches: int = ANALYSIS_MAX_BATCHES):
+        self.processes = max(1, processes)
+        self._lock = threading.Lock()
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        # One thread per pooled engine process: more would only wait on a checkout.
+        self._thread_pool = ThreadPoolExecutor(max(1, POOL_SIZE) * len(BOT_ENGINE_PATHS),
+                                               thread_name_prefix="analysis")
+        self._batches = threading.BoundedSemaphore(max(1, max_batches))
+        self.running = 0
+        self.analysed = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def _processes(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(
+                    self.processes, mp_context=multiprocessing.get_context("spawn"))
+            return self._process_pool
+
+    def _submit(self, bot_type: str, fen: str, think_time: float) -> Future:
+        if bot_type != "minmax" or SEARCH_WORKERS > 1:
+            # Engines wait on their own subprocess, and a parallel minmax fans out by itself.
+            return self._thread_pool.submit(analyse_fen, fen, bot_type, think_time)
+        try:
+            return self._processes().submit(analyse_fen, fen, bot_type, think_time)
+        except BrokenProcessPool:
+            with self._lock:
+                self._process_pool = None
+            return self._processes().submit(analyse_fen, fen, bot_type, think_time)
+
+    def window(self, bot_type: str) -> int:
+        if bot_type == "minmax":
+            return 1 if SEARCH_WORKERS > 1 else self.processes
+        return max(1, POOL_SIZE)
+
+    # Claims one of the batch slots; raises AnalysisBusy when they are all taken.
+    def acquire(self) -> None:
+        if not self._batches.acquire(blocking=False):
+            raise AnalysisBusy(f"{ANALYSIS_MAX_BATCHES} analysis batches already running")
+        with self._lock:
+            self.running += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self.running -= 1
+        self._batches.release()
+
+    # Yields one result dict per position, in the order they finish. At most `window`
+    # positions are in flight, and the next is only submitted once the caller takes a
+    # result, so a slow reader holds the work back instead of piling up results.
+    # Positions not started when the budget runs out are reported as skipped.
+    def run(self, positions: List[Position], bot_type: str, think_time: float, budget: float) -> Iterator[dict]:
+        started = time.monotonic()
+        deadline = started + budget
+        pending = {}
+        queued = iter(enumerate(positions))
+        analysed = failed = skipped = 0
+        try:
+            while True:
+                while len(pending) < self.window(bot_type) and time.monotonic() < deadline:
+                    item = next(queued, None)
+                    if item is None:
+                        break
+                    pending[self._submit(bot_type, item[1].fen, think_time)] = item
+                if not pending:
+                    break
+                done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in done:
+                    index, position = pending.pop(future)
+                    line = self._result_line(index, position, bot_type)
+                    try:
+                        line.update(future.result())
+                        analysed += 1
+                    except Exception as e:
+                        line["error"] = str(e) or type(e).__name__
+                        failed += 1
+                    self._remember(position.fen, line, bot_type, think_time)
+                    yield line
+            for index, position in sorted(pending.values()) + list(queued):
+                line = self._result_line(index, position, bot_type)
+                line["error"] = "Time budget exceeded."
+                skipped += 1
+                yield line
+            yield {"done": True, "positions": len(positions), "analysed": analysed, "failed": failed,
+                   "skipped": skipped, "elapsed": round(time.monotonic() - started, 3)}
+        finally:
+            for future in pending:
+                future.cancel()
+            with self._lock:
+                self.analysed += analysed
+                self.failed += failed
+                self.skipped += skipped
+
+    def _result_line(self, index: int, position: Position, bot_type: str) -> dict:
+        line = {"index": index, "fen": position.fen, "bot_type": bot_type}
+        if position.game is not None:
+            line.update(game=position.game, ply=position.ply, played=position.played)
+        return line
+
+    # A minmax search run in a worker process is counted and its reply shared here too,
+    # the same as a bot job's.
+    def _remember(self, fen: str, line: dict, bot_type: str, think_time: float) -> None:
+        result = line.pop("search", None)
+        if result is not None and bot_type == "minmax" and SEARCH_WORKERS <= 1:
+            record_search(result)
+            remember_minmax_move(chess.Board(fen), result, chess.engine.Limit(time=think_time))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "running": self.running,
+                "max_batches": ANALYSIS_MAX_BATCHES,
+                "processes": self.processes,
+                "analysed": self.analysed,
+                "failed": self.failed,
+                "skipped": self.skipped,
+            }
+
+    def shutdown(self) -> None:
+        self._thread_pool.shutdown(wait=False, cancel_futures=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,65 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_state import GameState
+from game_store import GameStore, SQLiteGameStore
+
+
+# Plays the same random games through each store and reports the cost per move,
+# including the lookup, the move itself and the save.
+def play(store: GameStore, games: int, plies: int, seed: int) -> float:
+    rng = random.Random(seed)
+    game_ids = []
+    for i in range(games):
+        game_state = GameState(f"bench-{i}", player1="White", player2="Black")
+        game_state.start_game()
+        store.add(game_state)
+        game_ids.append(game_state.game_id)
+
+    moves = 0
+    started = time.perf_counter()
+    for _ in range(plies):
+        for game_id in game_ids:
+            with store.locked(game_id) as game_state:
+                legal = list(game_state.board.legal_moves)
+                if not legal:
+                    continue
+                move = rng.choice(legal)
+                game_state.board.push(move)
+                game_state.add_move(move)
+                store.save(game_state)
+                moves += 1
+    store.flush()
+    return (time.perf_counter() - started) / max(1, moves)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-move cost of the game store backends.")
+    parser.add_argument("--games", type=int, default=200)
+    parser.add_argument("--plies", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = [
+            ("memory", GameStore()),
+            ("sqlite, cached", SQLiteGameStore(os.path.join(tmp, "cached.db"), cache_size=args.games * 2)),
+            ("sqlite, uncached", SQLiteGameStore(os.path.join(tmp, "uncached.db"), cache_size=1, shards=1,
+                                                 revalidate_after=0.0)),
+        ]
+        baseline = None
+        for name, store in backends:
+            per_move = play(store, args.games, args.plies, args.seed)
+            store.close()
+            baseline = baseline or per_move
+            print(f"{name:18s} {per_move * 1e6:9.1f} us/move  {per_move / baseline:6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+import chess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_state import GameState
+
+
+# A few random games long enough to replay; every benchmarked game reuses one of them.
+def random_games(count: int, plies: int, seed: int) -> list:
+    rng = random.Random(seed)
+    games = []
+    while len(games) < count:
+        board = chess.Board()
+        for _ in range(plies):
+            legal = list(board.legal_moves)
+            if not legal:
+                break
+            board.push(rng.choice(legal))
+        if len(board.move_stack) == plies:
+            games.append(list(board.move_stack))
+    return games
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Memory held per live game.")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--plies", type=int, default=80)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    lines = random_games(50, args.plies, args.seed)
+
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    game_states = []
+    for i in range(args.games):
+        game_state = GameState(f"bench-{i}", player1="White", player2="Black")
+        game_state.start_game()
+        for move in lines[i % len(lines)]:
+            game_state.board.push(move)
+            game_state.add_move(move)
+        game_states.append(game_state)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    game_bytes = tracemalloc.get_traced_memory()[0] - base
+
+    histories = [game_state.move_history for game_state in game_states]
+    del game_state, game_states
+    gc.collect()
+    history_bytes = tracemalloc.get_traced_memory()[0] - base
+
+    # What the same histories cost as the per-ply dicts GameState used to keep.
+    dicts = [history.to_dicts("White", "Black") for history in histories]
+    gc.collect()
+    dict_bytes = tracemalloc.get_traced_memory()[0] - base - history_bytes
+    tracemalloc.stop()
+
+    print(f"{args.games} games x {args.plies} plies ({elapsed:.1f}s to play)")
+    print(f"{'whole GameState':>24} {game_bytes / args.games:>10.0f} bytes/game")
+    print(f"{'compact move history':>24} {history_bytes / args.games:>10.0f} bytes/game")
+    print(f"{'history as dicts':>24} {dict_bytes / args.games:>10.0f} bytes/game")
+
+
+if __name__ == "__main__":
+    main()
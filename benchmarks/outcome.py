@@ -0,0 +1,69 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game_state import GameState
+
+
+# Random games, every third one limited to quiet moves among the first few legal ones
+# so that repetitions come up, with the occasional undo of a few plies and redo.
+def play(rng: random.Random, shuffle: bool, max_plies: int):
+    game_state = GameState("outcome")
+    board = game_state.board
+    for _ in range(max_plies):
+        legal = list(board.legal_moves)
+        if not legal:
+            break
+        if shuffle:
+            legal = [move for move in legal if not board.is_zeroing(move)][:4] or legal
+        move = rng.choice(legal)
+        board.push(move)
+        yield game_state, "move", move
+        if rng.random() < 0.05:
+            yield game_state, "undo", rng.randint(1, 4)
+            if rng.random() < 0.5:
+                yield game_state, "redo", rng.randint(1, 4)
+        if game_state.has_game_over:
+            break
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="GameState outcome detection against board.outcome().")
+    parser.add_argument("--games", type=int, default=300)
+    parser.add_argument("--plies", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    positions = mismatches = 0
+    spent = 0.0
+    terminations = {}
+    for number in range(args.games):
+        for game_state, action, argument in play(rng, number % 3 == 0, args.plies):
+            started = time.perf_counter()
+            if action == "undo":
+                game_state.undo_moves(argument)
+            elif action == "redo":
+                game_state.redo_moves(argument)
+            else:
+                game_state.add_move(argument)
+            spent += time.perf_counter() - started
+            positions += 1
+            outcome = game_state.board.outcome()
+            if (outcome.result() if outcome else None) != game_state.result:
+                mismatches += 1
+                print(f"  {game_state.board.fen()}: outcome {outcome}, GameState {game_state.result}")
+            if outcome is not None:
+                terminations[outcome.termination.name] = terminations.get(outcome.termination.name, 0) + 1
+    print(f"{positions} positions, {mismatches} mismatches, {spent / positions * 1e6:.1f} us per add_move/undo_moves/redo_moves")
+    print("endings:", terminations)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
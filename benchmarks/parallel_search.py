@@ -0,0 +1,65 @@
+import argparse
+import os
+import sys
+import time
+
+import chess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import game
+
+
+POSITIONS = [
+    "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+    "r1bq1rk1/pp2bppp/2n1pn2/2pp4/3P4/2PBPN2/PP1N1PPP/R1BQ1RK1 w - - 0 8",
+    "r2q1rk1/ppp2ppp/2npbn2/2b1p3/2B1P3/2NP1N2/PPP2PPP/R1BQ1RK1 w - - 4 8",
+    "8/2k5/3p4/p2P1p2/P2P1P2/8/3K4/8 w - - 0 1",
+]
+
+
+def fresh_workers(workers: int) -> None:
+    # Worker tables survive between searches; start every measurement from empty ones.
+    game.shutdown_search_workers()
+    if workers > 1:
+        game.parallel_selectmove(chess.Board(), 1, book=None, workers=workers)
+    game.transposition_table.clear()
+
+
+def timed(workers: int, fen: str, depth: int):
+    fresh_workers(workers)
+    board = chess.Board(fen)
+    started = time.perf_counter()
+    if workers > 1:
+        move = game.parallel_selectmove(board, depth, book=None, workers=workers)
+    else:
+        move = game.selectmove(board, depth, book=None)
+    return move, time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Speedup of the parallel minimax root search.")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--workers", default="1,2,4,8")
+    args = parser.parse_args()
+    counts = [int(count) for count in args.workers.split(",")]
+
+    print(f"cpus: {os.cpu_count()}, depth: {args.depth}")
+    totals = {count: 0.0 for count in counts}
+    mismatches = {count: 0 for count in counts}
+    for fen in POSITIONS:
+        serial, _ = timed(1, fen, args.depth)
+        for count in counts:
+            move, elapsed = timed(count, fen, args.depth)
+            totals[count] += elapsed
+            if move != serial:
+                mismatches[count] += 1
+                print(f"  {count} workers chose {move} instead of {serial} at {fen}")
+    print(f"{'workers':>8} {'time':>9} {'speedup':>8} {'mismatches':>11}")
+    for count in counts:
+        print(f"{count:>8} {totals[count]:>8.2f}s {totals[counts[0]] / totals[count]:>7.2f}x {mismatches[count]:>11}")
+    game.shutdown_search_workers()
+
+
+if __name__ == "__main__":
+    main()
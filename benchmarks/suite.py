@@ -0,0 +1,261 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+import chess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import game
+import game_state
+
+
+# (name, fen, depth, expected leaf count)
+PERFT_POSITIONS = [
+    ("startpos", chess.STARTING_FEN, 3, 8902),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 2, 2039),
+    ("endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 3, 2812),
+    ("promotions", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", 2, 264),
+    ("middlegame", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 2, 1486),
+]
+
+SEARCH_POSITIONS = [
+    ("opening", "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3"),
+    ("queens_gambit", "r1bq1rk1/pp2bppp/2n1pn2/2pp4/3P4/2PBPN2/PP1N1PPP/R1BQ1RK1 w - - 0 8"),
+    ("italian", "r2q1rk1/ppp2ppp/2npbn2/2b1p3/2B1P3/2NP1N2/PPP2PPP/R1BQ1RK1 w - - 4 8"),
+    ("tactics", "r1b1k2r/ppppnppp/2n2q2/2b5/3NP3/2P1B3/PP3PPP/RN1QKB1R w KQkq - 0 1"),
+    ("pawn_endgame", "8/2k5/3p4/p2P1p2/P2P1P2/8/3K4/8 w - - 0 1"),
+]
+
+
+def perft(board: chess.Board, depth: int) -> int:
+    if depth == 1:
+        return board.legal_moves.count()
+    nodes = 0
+    for move in board.generate_legal_moves():
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+def metric(results: dict, name: str, value: float, unit: str, better: str) -> None:
+    results[name] = {"value": value, "unit": unit, "better": better}
+
+
+# Timings below are the best of several runs, which is far less noisy than the mean.
+def bench_perft(results: dict, scale: int, repeat: int) -> None:
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, depth, expected in PERFT_POSITIONS:
+        depth += scale
+        board = chess.Board(fen)
+        elapsed = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            nodes = perft(board, depth)
+            elapsed = min(elapsed, time.perf_counter() - started)
+        if scale == 0 and nodes != expected:
+            raise AssertionError(f"perft {name} depth {depth}: {nodes} leaves, expected {expected}")
+        total_nodes += nodes
+        total_time += elapsed
+        metric(results, f"perft.{name}.nps", nodes / elapsed, "nodes/s", "higher")
+        print(f"  perft {name:<12} depth {depth}  {nodes:>9} leaves  {nodes / elapsed:>10.0f} nodes/s")
+    metric(results, "perft.total.nps", total_nodes / total_time, "nodes/s", "higher")
+
+
+def bench_search(results: dict, depth: int) -> None:
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen in SEARCH_POSITIONS:
+        game.transposition_table.clear()
+        game.transposition_table.new_search()
+        board = game.SearchBoard(fen)
+        info = game.SearchInfo()
+        for current in range(1, depth + 1):
+            move, score = game.search_root(board, current, info)
+            metric(results, f"search.{name}.time_to_depth_{current}", info.elapsed(), "s", "lower")
+        total_nodes += info.nodes
+        total_time += info.elapsed()
+        metric(results, f"search.{name}.nodes", info.nodes, "nodes", "lower")
+        metric(results, f"search.{name}.nps", info.nodes / info.elapsed(), "nodes/s", "higher")
+        print(f"  search {name:<14} depth {depth}  {move.uci():<6} {score:>6}  "
+              f"{info.nodes:>8} nodes  {info.elapsed():>7.2f}s  {info.nodes / info.elapsed():>8.0f} nodes/s")
+    metric(results, "search.total.nps", total_nodes / total_time, "nodes/s", "higher")
+    metric(results, "search.total.time", total_time, "s", "lower")
+
+
+def random_positions(count: int, seed: int) -> list:
+    rng = random.Random(seed)
+    boards = []
+    for _ in range(count):
+        board = chess.Board()
+        for _ in range(rng.randint(0, 120)):
+            legal = list(board.legal_moves)
+            if not legal:
+                break
+            board.push(rng.choice(legal))
+        boards.append(board)
+    return boards
+
+
+def bench_micro(results: dict, seed: int, repeat: int) -> None:
+    boards = random_positions(200, seed)
+    search_boards = [game.SearchBoard.from_board(board) for board in boards]
+
+    def per_call(function, items, number: int = 10) -> float:
+        runs = timeit.repeat(lambda: [function(item) for item in items], number=number, repeat=repeat)
+        return min(runs) / (number * len(items))
+
+    timings = {
+        "micro.game.evaluate_board": per_call(game.evaluate_board, boards),
+        "micro.search_board.evaluate": per_call(lambda board: board.evaluate(), search_boards),
+        "micro.game_state.evaluate_board": per_call(game_state.evaluate_board, boards),
+        "micro.get_board_state.cached": per_call(game.get_board_state, boards),
+    }
+    game._board_rows.cache_clear()
+    timings["micro.get_board_state.uncached"] = per_call(
+        lambda board: game._board_rows.__wrapped__(game.board_key(board)), boards)
+    for name, seconds in timings.items():
+        metric(results, name, seconds * 1e6, "us/call", "lower")
+        print(f"  {name:<36} {seconds * 1e6:>8.2f} us/call")
+
+
+def bench_http(results: dict, games: int, plies: int, seed: int) -> None:
+    import server
+
+    game.position_cache.clear()
+    client = server.app.test_client()
+    rng = random.Random(seed)
+    latencies = {"/start-game": [], "/human-move": [], "/bot-move": []}
+
+    def call(route: str, function):
+        started = time.perf_counter()
+        response = function()
+        latencies[route].append(time.perf_counter() - started)
+        if response.status_code != 200:
+            raise AssertionError(f"{route} returned {response.status_code}: {response.get_data(as_text=True)}")
+        return response.get_json()
+
+    started = time.perf_counter()
+    for _ in range(games):
+        game_id = call("/start-game", lambda: client.post("/start-game", json={"is_vs_bot": True}))["game_json"]["game_id"]
+        board = chess.Board()
+        for _ in range(plies // 2):
+            legal = list(board.legal_moves)
+            if not legal:
+                break
+            san = board.san(rng.choice(legal))
+            board.push_san(san)
+            call("/human-move", lambda: client.post("/human-move", json={"game_id": game_id, "move": san}))
+            if board.is_game_over():
+                break
+            reply = call("/bot-move", lambda: client.get(f"/bot-move?game_id={game_id}&bot_type=minmax"))
+            board.push_uci(reply["game_json"]["move_history"][-1]["move"])
+            if board.is_game_over():
+                break
+    elapsed = time.perf_counter() - started
+
+    requests = sum(len(samples) for samples in latencies.values())
+    metric(results, "http.requests_per_second", requests / elapsed, "requests/s", "higher")
+    print(f"  http {requests} requests in {elapsed:.2f}s, {requests / elapsed:.1f} requests/s")
+    for route, samples in latencies.items():
+        samples.sort()
+        p50 = statistics.median(samples)
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        metric(results, f"http.{route.strip('/')}.p50", p50 * 1000, "ms", "lower")
+        metric(results, f"http.{route.strip('/')}.p95", p95 * 1000, "ms", "lower")
+        print(f"  http {route:<12} p50 {p50 * 1000:>8.2f} ms  p95 {p95 * 1000:>8.2f} ms  ({len(samples)} calls)")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+# Prints each metric's change against the baseline and returns the names of those
+# that got worse by more than the tolerance.
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    print(f"\n{'metric':<44} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None or not previous["value"]:
+            continue
+        change = (current["value"] - previous["value"]) / previous["value"]
+        worse = -change if current["better"] == "higher" else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        if flag:
+            regressions.append(name)
+        print(f"{name:<44} {previous['value']:>12.2f} {current['value']:>12.2f} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Move generation, search, evaluation and HTTP benchmarks.")
+    parser.add_argument("--only", default="perft,search,micro,http",
+                        help="comma-separated parts to run (perft, search, micro, http)")
+    parser.add_argument("--perft-extra-depth", type=int, default=0,
+                        help="search each perft position this many plies deeper (counts are then not checked)")
+    parser.add_argument("--search-depth", type=int, default=3)
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--plies", type=int, default=20)
+    parser.add_argument("--bot-time", type=float, default=0.1, help="minmax think time for the HTTP part")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per perft and micro timing, best kept")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against results saved earlier with --output")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="relative slowdown reported as a regression (default 0.10)")
+    args = parser.parse_args()
+    parts = [part.strip() for part in args.only.split(",") if part.strip()]
+    game.MINMAX_TIME_LIMIT = args.bot_time
+
+    results = {}
+    if "perft" in parts:
+        print("perft")
+        bench_perft(results, args.perft_extra_depth, args.repeat)
+    if "search" in parts:
+        print("search")
+        bench_search(results, args.search_depth)
+    if "micro" in parts:
+        print("micro")
+        bench_micro(results, args.seed, args.repeat)
+    if "http" in parts:
+        print("http")
+        bench_http(results, args.games, args.plies, args.seed)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline)["results"], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
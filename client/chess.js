@@ -70,6 +70,7 @@ class ChessGame {
     this.board = [];
     this.draggedPiece = null;
     this.game_json = null;
+    this.eventSource = null;
     this.playerStatsElements = {
       white: {},
       black: {},
@@ -128,6 +129,7 @@ class ChessGame {
   }
 
   resetGame() {
+    this.unsubscribeFromGame();
     this.boardContainer.innerHTML = "";
     this.board = [];
     this.draggedPiece = null;
@@ -150,9 +152,68 @@ class ChessGame {
     this.playerInfoModal.classList.toggle("modal-show");
   }
 
+  // Follows the game's server-sent events so moves made elsewhere (the other player,
+  // a spectator's view, a bot move finishing asynchronously) show up without polling.
+  subscribeToGame(game_id) {
+    if (!game_id || !window.EventSource) return;
+    if (this.eventSource?.gameId === game_id) return;
+    this.unsubscribeFromGame();
+
+    const version = this.game_json?.version;
+    const query = version === undefined ? "" : `&since=${version}`;
+    this.eventSource = new EventSource(
+      `${this.apiBaseUrl}/game-events?game_id=${game_id}${query}`
+    );
+    this.eventSource.gameId = game_id;
+    for (const type of ["state", "move", "undo", "redo", "jump", "reset"]) {
+      this.eventSource.addEventListener(type, (event) =>
+        this.applyGameEvent(JSON.parse(event.data))
+      );
+    }
+    this.eventSource.addEventListener("game_over", (event) => {
+      const { message } = JSON.parse(event.data);
+      this.toast(message, "success", true);
+    });
+  }
+
+  unsubscribeFromGame() {
+    this.eventSource?.close();
+    this.eventSource = null;
+  }
+
+  // Events carry either the whole game or only what changed since the previous version.
+  applyGameEvent({ game_json, board_state }) {
+    if (!game_json || !this.game_json) return;
+    if (game_json.version <= (this.game_json.version ?? -1)) return;
+    if (game_json.since === undefined) {
+      this.game_json = game_json;
+    } else if (game_json.since === this.game_json.version) {
+      const { moves_from, moves, since, ...fields } = game_json;
+      const history = (this.game_json.move_history || []).slice(0, moves_from);
+      this.game_json = {
+        ...this.game_json,
+        ...fields,
+        move_history: history.concat(moves || []),
+      };
+    } else {
+      // Missed an event; ask for everything since the version we hold.
+      this.eventSource.close();
+      this.eventSource = null;
+      return this.subscribeToGame(game_json.game_id);
+    }
+    this.board = board_state || this.board;
+    this.renderBoard(this.board);
+    this.updatePlayerStats("white", this.game_json);
+    this.updatePlayerStats("black", this.game_json);
+    if (this.game_json.message) {
+      this.currentIndicator.textContent = this.game_json.message;
+    }
+  }
+
   async updateGameState(response) {
     this.game_json = response?.game_json || {};
     this.board = response?.board_state || [];
+    this.subscribeToGame(this.game_json?.game_id);
     this.player1Name.textContent = this.game_json?.player1;
     this.player2Name.textContent = this.game_json?.player2;
     this.updatePlayerStats("white", this.game_json);
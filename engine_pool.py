@@ -0,0 +1,240 @@
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import chess.engine
+
+
+POOL_SIZE = int(os.environ.get("PYCHESS_ENGINE_POOL_SIZE", "2"))
+CHECKOUT_TIMEOUT = float(os.environ.get("PYCHESS_ENGINE_CHECKOUT_TIMEOUT", "5.0"))
+HEALTH_CHECK_INTERVAL = float(os.environ.get("PYCHESS_ENGINE_HEALTH_CHECK_INTERVAL", "30.0"))
+# PYCHESS_WARM_ENGINES=0 leaves each pool to start its engines on their first checkout.
+WARM_ENGINES = os.environ.get("PYCHESS_WARM_ENGINES", "1").strip().lower() in ("1", "true", "yes")
+
+# Errors after which an engine process can no longer be trusted and is replaced.
+ENGINE_FAILURES = (chess.engine.EngineError, chess.engine.EngineTerminatedError, TimeoutError, OSError)
+
+
+class EnginePoolTimeout(Exception):
+    pass
+
+
+class EnginePoolClosed(Exception):
+    pass
+
+
+class _Worker:
+    __slots__ = ("engine", "last_used")
+
+    def __init__(self, engine: chess.engine.SimpleEngine):
+        self.engine = engine
+        self.last_used = time.monotonic()
+
+
+class EnginePool:
+    def __init__(
+        self,
+        engine_path: str,
+        size: int = POOL_SIZE,
+        checkout_timeout: float = CHECKOUT_TIMEOUT,
+        health_check_interval: float = HEALTH_CHECK_INTERVAL,
+    ):
+        self.engine_path = engine_path
+        self.size = max(1, size)
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self._idle: "queue.LifoQueue[_Worker]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._workers = 0
+        self._busy = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._restarts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _spawn(self) -> _Worker:
+        return _Worker(chess.engine.SimpleEngine.popen_uci(self.engine_path))
+
+    def _is_healthy(self, worker: _Worker) -> bool:
+        # A crashed process resolves its returncode future; long idle engines are pinged as well.
+        if worker.engine.returncode.done():
+            return False
+        if time.monotonic() - worker.last_used < self.health_check_interval:
+            return True
+        try:
+            worker.engine.ping()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, worker: _Worker, restart: bool = False) -> None:
+        with self._lock:
+            self._workers -= 1
+            if restart:
+                self._restarts += 1
+        try:
+            worker.engine.quit()
+        except Exception:
+            try:
+                worker.engine.close()
+            except Exception:
+                pass
+
+    def _checkout(self, timeout: Optional[float]) -> _Worker:
+        deadline = time.monotonic() + (self.checkout_timeout if timeout is None else timeout)
+        while True:
+            if self._closed:
+                raise EnginePoolClosed(self.engine_path)
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                worker = None
+
+            if worker is None:
+                spawn = False
+                with self._lock:
+                    if self._workers < self.size:
+                        self._workers += 1
+                        spawn = True
+                if spawn:
+                    try:
+                        return self._spawn()
+                    except Exception:
+                        with self._lock:
+                            self._workers -= 1
+                        raise
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise EnginePoolTimeout(f"No idle engine for {self.engine_path}")
+                try:
+                    worker = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    raise EnginePoolTimeout(f"No idle engine for {self.engine_path}")
+
+            if self._is_healthy(worker):
+                return worker
+            self._discard(worker, restart=True)
+
+    def warm(self) -> None:
+        spawned = []
+        with self._lock:
+            missing = self.size - self._workers
+            self._workers += missing
+        try:
+            for _ in range(missing):
+                spawned.append(self._spawn())
+        finally:
+            with self._lock:
+                self._workers -= missing - len(spawned)
+            for worker in spawned:
+                self._idle.put(worker)
+
+    @contextmanager
+    def engine(self, timeout: Optional[float] = None) -> Iterator[chess.engine.SimpleEngine]:
+        started = time.monotonic()
+        try:
+            worker = self._checkout(timeout)
+        except EnginePoolTimeout:
+            with self._lock:
+                self._timeouts += 1
+            raise
+        waited = time.monotonic() - started
+        with self._lock:
+            self._busy += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+        healthy = True
+        try:
+            yield worker.engine
+        except ENGINE_FAILURES:
+            healthy = False
+            raise
+        finally:
+            with self._lock:
+                self._busy -= 1
+            if healthy and not self._closed:
+                worker.last_used = time.monotonic()
+                self._idle.put(worker)
+            else:
+                self._discard(worker, restart=not healthy)
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(worker)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "engine_path": self.engine_path,
+                "size": self.size,
+                "workers": self._workers,
+                "busy": self._busy,
+                "idle": self._idle.qsize(),
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "restarts": self._restarts,
+                "wait_time_total": self._wait_total,
+                "wait_time_max": self._wait_max,
+                "wait_time_avg": self._wait_total / self._checkouts if self._checkouts else 0.0,
+            }
+
+
+##############################################
+#           POOL REGISTRY                    #
+##############################################
+_pools: Dict[str, EnginePool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(engine_path: str) -> EnginePool:
+    pool = _pools.get(engine_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(engine_path)
+            if pool is None:
+                pool = EnginePool(engine_path)
+                _pools[engine_path] = pool
+    return pool
+
+
+# Starts every engine of each pool up front, so the first bot moves don't pay for process
+# startup and hash allocation. Binaries that aren't installed are skipped.
+def warm_pools(engine_paths: Iterable[str]) -> None:
+    for engine_path in engine_paths:
+        if not os.path.exists(engine_path):
+            continue
+        try:
+            get_pool(engine_path).warm()
+        except ENGINE_FAILURES as e:
+            print(f"Could not warm the engines of {engine_path}: {e}", file=sys.stderr)
+
+
+def pool_stats() -> List[dict]:
+    return [pool.stats() for pool in list(_pools.values())]
+
+
+def shutdown_pools() -> None:
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+# Engines run their event loops on non-daemon threads, which the interpreter joins
+# before plain atexit handlers fire, so register with the threading shutdown hook.
+getattr(threading, "_register_atexit", atexit.register)(shutdown_pools)
@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+
+EVENT_BUFFER_SIZE = int(os.environ.get("PYCHESS_EVENT_BUFFER_SIZE", "64"))
+EVENT_KEEPALIVE = float(os.environ.get("PYCHESS_EVENT_KEEPALIVE", "15"))
+# Open streams across all games. Each one holds its worker (a thread, or a greenlet
+# under gevent) for as long as it stays open, so keep this below the worker count.
+EVENT_MAX_SUBSCRIBERS = int(os.environ.get("PYCHESS_EVENT_MAX_SUBSCRIBERS", "32"))
+
+
+def format_event(event_type: str, data: dict, event_id: Optional[int] = None) -> str:
+    lines = [f"event: {event_type}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+class SubscribersFull(Exception):
+    pass
+
+
+class Subscriber:
+    __slots__ = ("game_id", "events", "condition", "lagged", "closed")
+
+    def __init__(self, game_id: str, buffer_size: int = EVENT_BUFFER_SIZE):
+        self.game_id = game_id
+        # Formatted events not yet written to the client. When a slow client lets it fill
+        # up the oldest are dropped and the client is sent the whole game again instead.
+        self.events: deque = deque(maxlen=max(1, buffer_size))
+        self.condition = threading.Condition()
+        self.lagged = False
+        self.closed = False
+
+    def push(self, event: str) -> None:
+        with self.condition:
+            if len(self.events) == self.events.maxlen:
+                self.lagged = True
+            self.events.append(event)
+            self.condition.notify()
+
+    def close(self) -> None:
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+    # Waits up to timeout for something to send; returns the pending events and whether
+    # any were dropped since the last call.
+    def next_events(self, timeout: float) -> Tuple[List[str], bool]:
+        with self.condition:
+            self.condition.wait_for(lambda: self.events or self.closed, timeout)
+            events = list(self.events)
+            self.events.clear()
+            lagged, self.lagged = self.lagged, False
+            return events, lagged
+
+
+# Fans game events out to the open streams of this process. Publishing formats the
+# event once and appends it to each subscriber's buffer, so a game's mutation never
+# waits on a slow connection.
+class EventBroker:
+    def __init__(self, buffer_size: int = EVENT_BUFFER_SIZE, max_subscribers: int = EVENT_MAX_SUBSCRIBERS):
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self._count = 0
+        self.rejected = 0
+        self.published = 0
+        self.delivered = 0
+
+    # Raises SubscribersFull when max_subscribers streams are already open.
+    def subscribe(self, game_id: str) -> Subscriber:
+        subscriber = Subscriber(game_id, self.buffer_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                self.rejected += 1
+                raise SubscribersFull(f"{self.max_subscribers} event streams already open")
+            self._subscribers.setdefault(game_id, set()).add(subscriber)
+            self._count += 1
+        return subscriber
+
+    # Safe to call more than once, and after close_game.
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.game_id)
+            if subscribers is not None and subscriber in subscribers:
+                subscribers.discard(subscriber)
+                self._count -= 1
+                if not subscribers:
+                    del self._subscribers[subscriber.game_id]
+
+    def has_subscribers(self, game_id: str) -> bool:
+        return game_id in self._subscribers
+
+    def publish(self, game_id: str, event_type: str, data: dict, event_id: Optional[int] = None) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(game_id, ()))
+        if not subscribers:
+            return
+        event = format_event(event_type, data, event_id)
+        for subscriber in subscribers:
+            subscriber.push(event)
+        self.published += 1
+        self.delivered += len(subscribers)
+
+    def close_game(self, game_id: str) -> None:
+        with self._lock:
+            subscribers = self._subscribers.pop(game_id, set())
+            self._count -= len(subscribers)
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "games": len(self._subscribers),
+                "subscribers": self._count,
+                "max_subscribers": self.max_subscribers,
+                "rejected": self.rejected,
+                "published": self.published,
+                "delivered": self.delivered,
+            }
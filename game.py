@@ -3,11 +3,30 @@ import chess.svg
 import chess.polyglot
 import chess.pgn
 import chess.engine
+import functools
+import multiprocessing
 import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+from engine_pool import get_pool
+from opening_book import DEFAULT_BOOK, book_move
+from position_cache import CachedReply, open_position_cache
+from metrics import engine_calls, engine_errors, engine_replies, record_search
+from ponder import PONDER, game_engines
+from tablebase import covers as tablebase_covers, probe_score, tablebase_move
+from transposition import EXACT, LOWERBOUND, UPPERBOUND, TranspositionTable
 
 
 current_dir = os.path.dirname(__file__) 
 
+DEUTERIUM_PATH = os.path.join(current_dir, "books", "Deuterium_v2019.2.37.73_64bit.bin")
+CDRILL_PATH = os.path.join(current_dir, "books", "cdrill_2000.bin")
+STOCKFISH_PATH = os.path.join(current_dir, "books", "stockfish/stockfish-ubuntu-x86-64-sse41-popcnt")
+
 # Evaluating the board
 pawntable = [
     0, 0, 0, 0, 0, 0, 0, 0,
@@ -120,84 +139,559 @@ def evaluate_board(board: chess.Board) -> int:
         return -eval
 
 
+# Incremental evaluation: material plus piece-square value of every (colour, piece type)
+# on every square, from White's point of view, so a move only adjusts a running sum.
+piece_values = {
+    chess.PAWN: 100,
+    chess.KNIGHT: 320,
+    chess.BISHOP: 330,
+    chess.ROOK: 500,
+    chess.QUEEN: 900,
+    chess.KING: 0,
+}
+
+piece_square_tables = {
+    chess.PAWN: pawntable,
+    chess.KNIGHT: knightstable,
+    chess.BISHOP: bishopstable,
+    chess.ROOK: rookstable,
+    chess.QUEEN: queenstable,
+    chess.KING: kingstable,
+}
+
+piece_square_values = {
+    chess.WHITE: {
+        piece_type: [piece_values[piece_type] + table[square] for square in chess.SQUARES]
+        for piece_type, table in piece_square_tables.items()
+    },
+    chess.BLACK: {
+        piece_type: [-piece_values[piece_type] - table[chess.square_mirror(square)] for square in chess.SQUARES]
+        for piece_type, table in piece_square_tables.items()
+    },
+}
+
+
+def material_pst_score(board: chess.Board) -> int:
+    score = 0
+    for color in chess.COLORS:
+        for piece_type, values in piece_square_values[color].items():
+            for square in chess.scan_forward(board.pieces_mask(piece_type, color)):
+                score += values[square]
+    return score
+
+
+# Board that keeps the material/piece-square score up to date across push and pop.
+# Only push and pop are tracked, so build it from a FEN and don't edit it in place.
+class SearchBoard(chess.Board):
+
+    def __init__(self, fen: Optional[str] = chess.STARTING_FEN, *, chess960: bool = False):
+        super().__init__(fen, chess960=chess960)
+        self.eval_stack = [material_pst_score(self)]
+
+    @classmethod
+    def from_board(cls, board: chess.Board) -> "SearchBoard":
+        return cls(board.fen(), chess960=board.chess960)
+
+    def copy(self, *, stack=True) -> "SearchBoard":
+        board = super().copy(stack=stack)
+        board.eval_stack = list(self.eval_stack)
+        return board
+
+    def move_delta(self, move: chess.Move) -> int:
+        if not move:
+            return 0
+        color = self.turn
+        own = piece_square_values[color]
+        other = piece_square_values[not color]
+        from_square, to_square = move.from_square, move.to_square
+        piece_type = self.piece_type_at(from_square)
+
+        if piece_type == chess.KING:
+            rook_square = None
+            if self.occupied_co[color] & chess.BB_SQUARES[to_square]:
+                rook_square = to_square
+            elif abs(chess.square_file(to_square) - chess.square_file(from_square)) > 1:
+                rook_file = 7 if to_square > from_square else 0
+                rook_square = chess.square(rook_file, chess.square_rank(from_square))
+            if rook_square is not None:
+                rank = chess.square_rank(from_square)
+                kingside = rook_square > from_square
+                king_to = chess.square(6 if kingside else 2, rank)
+                rook_to = chess.square(5 if kingside else 3, rank)
+                return (own[chess.KING][king_to] - own[chess.KING][from_square]
+                        + own[chess.ROOK][rook_to] - own[chess.ROOK][rook_square])
+
+        delta = own[move.promotion or piece_type][to_square] - own[piece_type][from_square]
+        captured = self.piece_type_at(to_square)
+        if captured:
+            delta -= other[captured][to_square]
+        elif piece_type == chess.PAWN and to_square == self.ep_square:
+            delta -= other[chess.PAWN][to_square - 8 if color else to_square + 8]
+        return delta
+
+    def push(self, move: chess.Move) -> None:
+        self.eval_stack.append(self.eval_stack[-1] + self.move_delta(move))
+        super().push(move)
+
+    def pop(self) -> chess.Move:
+        move = super().pop()
+        self.eval_stack.pop()
+        return move
+
+    # Same result as evaluate_board, without rescanning the pieces.
+    def evaluate(self) -> int:
+        if not any(self.generate_legal_moves()):
+            if self.is_check():
+                return -9999 if self.turn else 9999
+            return 0
+        if self.is_insufficient_material():
+            return 0
+        score = self.eval_stack[-1]
+        return score if self.turn else -score
+
+
+MINMAX_TIME_LIMIT = float(os.environ.get("PYCHESS_MINMAX_TIME_LIMIT", "1.0"))
+MINMAX_MAX_DEPTH = int(os.environ.get("PYCHESS_MINMAX_MAX_DEPTH", "6"))
+MINMAX_BOOK = os.environ.get("PYCHESS_MINMAX_BOOK", DEFAULT_BOOK)
+
+MATE_SCORE = 9999
+
+# Distinct placements whose rendered board is kept for get_board_state.
+BOARD_STATE_CACHE_SIZE = int(os.environ.get("PYCHESS_BOARD_STATE_CACHE_SIZE", "4096"))
+
+# Processes the root moves of one minimax search are split across; 0 or 1 searches serially.
+SEARCH_WORKERS = int(os.environ.get("PYCHESS_SEARCH_WORKERS", "0"))
+# Parallel searches that can run at once, each with its own shared alpha.
+PARALLEL_SEARCH_SLOTS = int(os.environ.get("PYCHESS_PARALLEL_SEARCH_SLOTS", "64"))
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchInfo:
+    def __init__(self, limit: Optional[chess.engine.Limit] = None):
+        self.started = time.monotonic()
+        self.deadline = self.started + limit.time if limit is not None and limit.time else None
+        self.node_limit = limit.nodes if limit is not None else None
+        self.nodes = 0
+        self.qnodes = 0
+        self.tt_hits = 0
+        self.depth = 0
+        self.best_move: Optional[chess.Move] = None
+        self.killers: List[List[chess.Move]] = []
+        self.history = [0] * 8192
+
+    def visit(self) -> None:
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchTimeout()
+        if self.deadline is not None and self.nodes & 127 == 0 and time.monotonic() > self.deadline:
+            raise SearchTimeout()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def counts(self) -> Tuple[int, int, int]:
+        return self.nodes, self.qnodes, self.tt_hits
+
+    def add_counts(self, counts: Tuple[int, int, int]) -> None:
+        self.nodes += counts[0]
+        self.qnodes += counts[1]
+        self.tt_hits += counts[2]
+
+    def killers_at(self, ply: int) -> List[chess.Move]:
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        return self.killers[ply]
+
+    # Quiet moves that caused a beta cutoff become killers for their ply and earn
+    # history credit, so sibling nodes try them right after the captures.
+    def record_cutoff(self, board: chess.Board, move: chess.Move, depthleft: int, ply: int) -> None:
+        if is_capture_fast(board, move) or move.promotion:
+            return
+        killers = self.killers_at(ply)
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        self.history[history_index(board.turn, move)] += depthleft * depthleft
+
+
+class SearchResult(NamedTuple):
+    move: chess.Move
+    score: int
+    depth: int
+    nodes: int
+    time: float
+    qnodes: int = 0
+    tt_hits: int = 0
+
+
+# Shared by every minimax search in the process; entries are keyed on the full Zobrist hash.
+transposition_table = TranspositionTable()
+
+
+def history_index(color: chess.Color, move: chess.Move) -> int:
+    return (color << 12) | (move.from_square << 6) | move.to_square
+
+
+def is_capture_fast(board: chess.Board, move: chess.Move) -> bool:
+    return bool(board.occupied_co[not board.turn] & chess.BB_SQUARES[move.to_square]) or (
+        move.to_square == board.ep_square and board.pawns & chess.BB_SQUARES[move.from_square] != 0)
+
+
+# Most valuable victim first, least valuable attacker breaking ties.
+def mvv_lva(board: chess.Board, move: chess.Move) -> int:
+    victim = board.piece_type_at(move.to_square) or chess.PAWN
+    attacker = board.piece_type_at(move.from_square)
+    return victim * 8 - attacker
+
+
+HASH_MOVE_ORDER = 1 << 30
+CAPTURE_ORDER = 1 << 28
+KILLER_ORDER = 1 << 27
+
+
+def order_moves(board: chess.Board, hash_move: Optional[chess.Move] = None,
+                killers: Sequence[chess.Move] = (), history: Optional[List[int]] = None) -> list:
+    scored = []
+    for move in board.generate_legal_moves():
+        if move == hash_move:
+            order = HASH_MOVE_ORDER
+        elif is_capture_fast(board, move):
+            order = CAPTURE_ORDER + mvv_lva(board, move)
+        elif move.promotion:
+            order = CAPTURE_ORDER + move.promotion
+        elif move in killers:
+            order = KILLER_ORDER - killers.index(move)
+        elif history is not None:
+            order = history[history_index(board.turn, move)]
+        else:
+            order = 0
+        scored.append((order, move))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [move for _, move in scored]
+
+
+def order_captures(board: chess.Board) -> list:
+    return sorted(board.generate_legal_captures(), key=lambda move: mvv_lva(board, move), reverse=True)
+
+
 # Searching the best move using minimax and alphabeta algorithm with negamax implementation
-def alphabeta(board: chess.Board, alpha: int, beta: int, depthleft: int) -> int:
-    bestscore = -9999
+def alphabeta(board: SearchBoard, alpha: int, beta: int, depthleft: int, info: SearchInfo) -> int:
     if depthleft == 0:
-        return quiesce(board, alpha, beta)
-    for move in board.legal_moves:
+        return quiesce(board, alpha, beta, info)
+    info.visit()
+
+    # Within the loaded Syzygy tables the result is known exactly; no need to search on.
+    if tablebase_covers(board):
+        score = probe_score(board)
+        if score is not None:
+            return score
+
+    key = chess.polyglot.zobrist_hash(board)
+    entry = transposition_table.probe(key)
+    hash_move = None
+    if entry is not None:
+        info.tt_hits += 1
+        hash_move = entry.move
+        # Only same-depth results are reused, so a position's score never depends on
+        # what else happened to be searched first (see parallel_search_root).
+        if entry.depth == depthleft:
+            if entry.bound == EXACT:
+                return entry.score
+            if entry.bound == LOWERBOUND and entry.score >= beta:
+                return entry.score
+            if entry.bound == UPPERBOUND and entry.score <= alpha:
+                return entry.score
+
+    alpha_orig = alpha
+    bestscore = -9999
+    bestmove = None
+    ply = len(board.move_stack)
+    for move in order_moves(board, hash_move, info.killers_at(ply), info.history):
         board.push(move)
-        score = -alphabeta(board, -beta, -alpha, depthleft - 1)
+        score = -alphabeta(board, -beta, -alpha, depthleft - 1, info)
         board.pop()
         if score >= beta:
+            info.record_cutoff(board, move, depthleft, ply)
+            transposition_table.store(key, depthleft, score, LOWERBOUND, move)
             return score
         if score > bestscore:
             bestscore = score
+            bestmove = move
         if score > alpha:
             alpha = score
+    bound = EXACT if bestscore > alpha_orig else UPPERBOUND
+    transposition_table.store(key, depthleft, bestscore, bound, bestmove)
     return bestscore
 
 
-def quiesce(board: chess.Board, alpha: int, beta: int) -> int:
-    stand_pat = evaluate_board(board)
+def quiesce(board: SearchBoard, alpha: int, beta: int, info: SearchInfo) -> int:
+    info.visit()
+    info.qnodes += 1
+    stand_pat = board.evaluate()
     if stand_pat >= beta:
         return beta
     if alpha < stand_pat:
         alpha = stand_pat
 
-    for move in board.legal_moves:
-        if board.is_capture(move):
-            board.push(move)
-            score = -quiesce(board, -beta, -alpha)
-            board.pop()
+    for move in order_captures(board):
+        board.push(move)
+        score = -quiesce(board, -beta, -alpha, info)
+        board.pop()
 
-            if score >= beta:
-                return beta
-            if score > alpha:
-                alpha = score
+        if score >= beta:
+            return beta
+        if score > alpha:
+            alpha = score
     return alpha
 
 
-def selectmove(board: chess.Board, depth: int) -> chess.Move:
+def search_root(board: SearchBoard, depth: int, info: SearchInfo) -> Tuple[chess.Move, int]:
+    key = chess.polyglot.zobrist_hash(board)
+    entry = transposition_table.probe(key)
+    bestMove = chess.Move.null()
+    bestValue = -99999
+    alpha = -100000
+    beta = 100000
+    for move in order_moves(board, entry.move if entry else None, history=info.history):
+        board.push(move)
+        boardValue = -alphabeta(board, -beta, -alpha, depth - 1, info)
+        if boardValue > bestValue:
+            bestValue = boardValue
+            bestMove = move
+            info.best_move = move
+        if boardValue > alpha:
+            alpha = boardValue
+        board.pop()
+    transposition_table.store(key, depth, bestValue, EXACT, bestMove)
+    return bestMove, bestValue
+
+
+def selectmove(board: chess.Board, depth: int, book: Optional[str] = DEFAULT_BOOK) -> chess.Move:
+    move = book_move(board, book) if book else None
+    if move is not None:
+        return move
+    probed = tablebase_move(board)
+    if probed is not None:
+        return probed[0]
+    transposition_table.new_search()
+    return search_root(SearchBoard.from_board(board), depth, SearchInfo())[0]
+
+
+# Deepens one ply at a time until the limit runs out and keeps the move of the
+# last completed iteration, so the think time is bounded instead of the depth.
+def iterative_deepening(board: chess.Board, limit: chess.engine.Limit,
+                        book: Optional[str] = MINMAX_BOOK, workers: int = SEARCH_WORKERS) -> SearchResult:
+    info = SearchInfo(limit)
+    move = book_move(board, book) if book else None
+    if move is not None:
+        return SearchResult(move, 0, 0, 0, info.elapsed())
+
+    transposition_table.new_search()
+    # Search a copy: an aborted iteration leaves its moves pushed on the board.
+    search_board = SearchBoard.from_board(board)
+    best_move = next(iter(board.legal_moves), chess.Move.null())
+    best_score = 0
+    for depth in range(1, (limit.depth or MINMAX_MAX_DEPTH) + 1):
+        try:
+            if workers > 1:
+                best_move, best_score = parallel_search_root(search_board, depth, info, workers)
+            else:
+                best_move, best_score = search_root(search_board, depth, info)
+        except SearchTimeout:
+            if info.depth == 0 and info.best_move is not None:
+                best_move = info.best_move
+            break
+        info.depth = depth
+        if abs(best_score) >= MATE_SCORE:
+            break
+        # The next iteration costs several times this one; don't start what can't finish.
+        if info.deadline is not None and info.elapsed() * 2 > limit.time:
+            break
+    return SearchResult(best_move, best_score, info.depth, info.nodes, info.elapsed(), info.qnodes, info.tt_hits)
+
+
+##############################################
+#           PARALLEL ROOT SEARCH             #
+##############################################
+_search_executor: Optional[ProcessPoolExecutor] = None
+_search_executor_workers = 0
+_search_executor_lock = threading.Lock()
+# One alpha per running parallel search, shared with the workers so a move searched
+# late starts from the best score any other worker has found so far.
+_root_alphas = None
+_free_slots: "queue.Queue[int]" = queue.Queue()
+
+
+def _init_search_worker(root_alphas) -> None:
+    global _root_alphas
+    _root_alphas = root_alphas
+
+
+def _search_executor_for(workers: int) -> ProcessPoolExecutor:
+    global _search_executor, _search_executor_workers, _root_alphas
+    with _search_executor_lock:
+        if _search_executor is None or _search_executor_workers != workers:
+            if _search_executor is not None:
+                _search_executor.shutdown(wait=False, cancel_futures=True)
+            # Spawned rather than forked: the server process holds locks and engine threads.
+            context = multiprocessing.get_context("spawn")
+            if _root_alphas is None:
+                _root_alphas = context.Array("i", PARALLEL_SEARCH_SLOTS)
+                for slot in range(PARALLEL_SEARCH_SLOTS):
+                    _free_slots.put(slot)
+            _search_executor = ProcessPoolExecutor(
+                workers, mp_context=context, initializer=_init_search_worker, initargs=(_root_alphas,))
+            _search_executor_workers = workers
+        return _search_executor
+
+
+def _reset_search_executor(executor: ProcessPoolExecutor) -> None:
+    global _search_executor
+    with _search_executor_lock:
+        if _search_executor is executor:
+            _search_executor = None
+
+
+def shutdown_search_workers() -> None:
+    global _search_executor
+    with _search_executor_lock:
+        if _search_executor is not None:
+            _search_executor.shutdown(wait=False, cancel_futures=True)
+            _search_executor = None
+
+
+# Runs in a worker: scores one root move. Without an explicit alpha the shared one for
+# the slot is used. Returns (score, alpha searched with, node counts), or None on timeout.
+def search_root_move(fen: str, move: str, depth: int, slot: int, alpha: Optional[int] = None,
+                     deadline: Optional[float] = None) -> Optional[Tuple[int, int, tuple]]:
+    if alpha is None:
+        alpha = _root_alphas[slot]
+    info = SearchInfo()
+    if deadline is not None:
+        info.deadline = info.started + deadline - time.time()
+    board = SearchBoard(fen)
+    board.push(chess.Move.from_uci(move))
+    transposition_table.new_search()
     try:
-      
-        book_path = os.path.join(current_dir, "books", "computer.bin")
-        move = chess.polyglot.MemoryMappedReader(book_path).weighted_choice(board).move
-        print("MMMMMM",move)
+        score = -alphabeta(board, -100000, -alpha, depth - 1, info)
+    except SearchTimeout:
+        return None
+    if score > alpha:
+        with _root_alphas.get_lock():
+            if score > _root_alphas[slot]:
+                _root_alphas[slot] = score
+    return score, alpha, info.counts()
+
+
+def _collect(futures: list) -> list:
+    results = [future.result() for future in futures]
+    if any(result is None for result in results):
+        raise SearchTimeout()
+    return results
+
+
+# Picks the same move as search_root at the same depth: the first move in root order
+# with the best score. A score above the alpha it was searched with is exact; one at
+# or below it only bounds the move, so earlier moves whose bound ties the best score
+# are searched again with a window just under it to settle the tie.
+def parallel_search_root(board: SearchBoard, depth: int, info: SearchInfo,
+                         workers: int = SEARCH_WORKERS) -> Tuple[chess.Move, int]:
+    key = chess.polyglot.zobrist_hash(board)
+    entry = transposition_table.probe(key)
+    moves = order_moves(board, entry.move if entry else None, history=info.history)
+    if not moves:
+        return chess.Move.null(), -99999
+
+    fen = board.fen()
+    deadline = time.time() + info.deadline - time.monotonic() if info.deadline is not None else None
+    executor = _search_executor_for(workers)
+    slot = _free_slots.get()
+    futures = []
+    try:
+        _root_alphas[slot] = -100000
+        futures = [executor.submit(search_root_move, fen, move.uci(), depth, slot, None, deadline)
+                   for move in moves]
+        results = _collect(futures)
+        for _, _, counts in results:
+            info.add_counts(counts)
+        best_score = max(score for score, alpha, _ in results if score > alpha)
+        best_index = next(i for i, (score, alpha, _) in enumerate(results) if score > alpha and score == best_score)
+        ties = [i for i in range(best_index) if results[i][1] >= best_score]
+        if ties:
+            futures = [executor.submit(search_root_move, fen, moves[i].uci(), depth, slot, best_score - 1, deadline)
+                       for i in ties]
+            for i, (score, alpha, counts) in zip(ties, _collect(futures)):
+                info.add_counts(counts)
+                if score > alpha:
+                    best_index = i
+                    break
+    except BrokenProcessPool:
+        # A crashed worker poisons the whole executor; the next search starts a fresh one.
+        _reset_search_executor(executor)
+        raise
+    finally:
+        # Let tasks that already started run out before the slot's alpha is reused.
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        _free_slots.put(slot)
+
+    info.best_move = moves[best_index]
+    transposition_table.store(key, depth, best_score, EXACT, moves[best_index])
+    return moves[best_index], best_score
+
+
+def parallel_selectmove(board: chess.Board, depth: int, book: Optional[str] = DEFAULT_BOOK,
+                        workers: int = SEARCH_WORKERS) -> chess.Move:
+    move = book_move(board, book) if book else None
+    if move is not None:
         return move
-    except Exception as e:
-        print(str(e))
-        bestMove = chess.Move.null()
-        bestValue = -99999
-        alpha = -100000
-        beta = 100000
-        for move in board.legal_moves:
-            board.push(move)
-            boardValue = -alphabeta(board, -beta, -alpha, depth - 1)
-            if boardValue > bestValue:
-                bestValue = boardValue
-                bestMove = move
-            if boardValue > alpha:
-                alpha = boardValue
-            board.pop()
-        return bestMove
+    probed = tablebase_move(board)
+    if probed is not None:
+        return probed[0]
+    transposition_table.new_search()
+    return parallel_search_root(SearchBoard.from_board(board), depth, SearchInfo(), max(1, workers))[0]
+
 
+# The 8x8 rows (rank 8 first) the client renders, built from the piece bitboards and
+# shared between every board in the same placement. Callers must not modify the result.
 def get_board_state(board: chess.Board) -> list:
-    fen = board.fen().split()[0]  
-    rows = fen.split('/')  
+    return _board_rows(board_key(board))
 
-    board_state = []
 
-    for row in rows:
-        board_row = []
-        for char in row:
-            if char.isdigit():
-                board_row.extend([None] * int(char))
-            else:
-                color = 'white' if char.isupper() else 'black'
-                board_row.append((char.upper(), color))
-        board_state.append(board_row)
-    return board_state   
+def board_key(board: chess.Board) -> tuple:
+    return (board.occupied_co[chess.WHITE], board.pawns, board.knights, board.bishops,
+            board.rooks, board.queens, board.kings, board.occupied)
+
+
+@functools.lru_cache(maxsize=BOARD_STATE_CACHE_SIZE)
+def _board_rows(key: tuple) -> list:
+    white = key[0]
+    cells = [None] * 64
+    for piece_type, mask in zip(chess.PIECE_TYPES, key[1:7]):
+        symbol = chess.piece_symbol(piece_type).upper()
+        for square in chess.scan_forward(mask):
+            cells[square] = (symbol, 'white' if white & chess.BB_SQUARES[square] else 'black')
+    return [cells[rank * 8:rank * 8 + 8] for rank in range(7, -1, -1)]
+
+
+# Opt-in compact wire formats: "fen" is the bare placement field, "array" is 64
+# characters from a8 to h1 with "." for an empty square. Anything else gets the rows.
+def get_compact_board_state(board: chess.Board, board_format: str = ""):
+    if board_format == "fen":
+        return board.board_fen()
+    if board_format == "array":
+        return _board_array(board_key(board))
+    return get_board_state(board)
+
+
+@functools.lru_cache(maxsize=BOARD_STATE_CACHE_SIZE)
+def _board_array(key: tuple) -> str:
+    return "".join("." if cell is None else cell[0] if cell[1] == 'white' else cell[0].lower()
+                   for row in _board_rows(key) for cell in row)
 
 
 
@@ -206,34 +700,141 @@ def get_board_state(board: chess.Board) -> list:
 #           BOT MOVE FUNCTIONS               #
 ##############################################
 
-def make_minmax_move(board: chess.Board) -> str:
-    move = selectmove(board, 3)
+BOT_NAMES = {
+    "minmax": "MinMax",
+    "deuterium": "Deuterium ",
+    "cdrill": "CDrill",
+    "stockfish": "Stockfish ",
+}
+
+BOT_ENGINE_PATHS = {
+    "deuterium": DEUTERIUM_PATH,
+    "cdrill": CDRILL_PATH,
+    "stockfish": STOCKFISH_PATH,
+}
+ENGINE_BOT_TYPES = {path: bot_type for bot_type, path in BOT_ENGINE_PATHS.items()}
+
+ENGINE_LIMIT = chess.engine.Limit(time=0.1)
+
+# Replies already found for a position, shared by every game. PYCHESS_POSITION_CACHE
+# selects "memory" (default) or "sqlite:///path" to share them between processes.
+position_cache = open_position_cache()
+
+
+def limit_key(limit: chess.engine.Limit) -> str:
+    return f"time={limit.time},depth={limit.depth},nodes={limit.nodes}"
+
+
+def bot_move_message(bot_type: str, move: chess.Move, result: Optional[SearchResult] = None) -> str:
+    message = f"{BOT_NAMES[bot_type]} algorithm based Bot made: {move}"
+    if result is not None:
+        message += f" (depth {result.depth}, {result.nodes} nodes)"
+    return message
+
+
+# The minmax reply that needs no search: a book move, a tablebase move, or one cached
+# for this position.
+# cache=False skips the position cache, for callers that time or rate the search itself.
+def quick_minmax_move(board: chess.Board, limit: Optional[chess.engine.Limit] = None,
+                      book: Optional[str] = MINMAX_BOOK, cache: bool = True) -> Optional[SearchResult]:
+    move = book_move(board, book) if book else None
+    if move is not None:
+        result = SearchResult(move, 0, 0, 0, 0.0)
+        record_search(result, "book")
+        return result
+    probed = tablebase_move(board)
+    if probed is not None:
+        result = SearchResult(probed[0], probed[1], 0, 0, 0.0)
+        record_search(result, "tablebase")
+        return result
+    if not cache:
+        return None
+    cached = position_cache.get(board, "minmax", limit_key(limit or chess.engine.Limit(time=MINMAX_TIME_LIMIT)))
+    if cached is not None:
+        result = SearchResult(cached.move, cached.score, cached.depth, 0, 0.0)
+        record_search(result, "cache")
+        return result
+    return None
+
+
+def remember_minmax_move(board: chess.Board, result: SearchResult,
+                         limit: Optional[chess.engine.Limit] = None) -> None:
+    # Book moves (depth 0) stay out so the book keeps choosing among its weighted moves.
+    if result.depth > 0:
+        position_cache.put(board, "minmax", limit_key(limit or chess.engine.Limit(time=MINMAX_TIME_LIMIT)),
+                           CachedReply(result.move, result.score, result.depth))
+
+
+def minmax_move(board: chess.Board, limit: Optional[chess.engine.Limit] = None,
+                book: Optional[str] = MINMAX_BOOK, cache: bool = True) -> SearchResult:
+    result = quick_minmax_move(board, limit, book, cache)
+    if result is None:
+        result = iterative_deepening(board, limit or chess.engine.Limit(time=MINMAX_TIME_LIMIT), None)
+        record_search(result)
+        if cache:
+            remember_minmax_move(board, result, limit)
+    return result
+
+
+# Entry point for search worker processes, which only receive the position.
+def minmax_move_for_fen(fen: str) -> SearchResult:
+    return minmax_move(chess.Board(fen))
+
+
+def make_minmax_move(board: chess.Board, limit: Optional[chess.engine.Limit] = None,
+                     book: Optional[str] = MINMAX_BOOK) -> str:
+    result = minmax_move(board, limit, book)
+    board.push(result.move)
+    return bot_move_message("minmax", result.move, result)
+
+
+# With game_id given and pondering on, the game's own engine answers (see ponder.py);
+# suggestions and analysis leave it out and use the shared pool.
+def play_engine_move(engine_path: str, board: chess.Board, game_id: Optional[str] = None) -> chess.Move:
+    bot_type = ENGINE_BOT_TYPES.get(engine_path, engine_path)
+    bound = PONDER and game_id is not None
+    cached = position_cache.get(board, bot_type, limit_key(ENGINE_LIMIT))
+    if cached is not None:
+        if bound:
+            # The engine would otherwise go on pondering a line the game has left.
+            game_engines.stop(game_id)
+        engine_replies.inc(bot=bot_type, source="cache")
+        return cached.move
+    started = time.perf_counter()
+    try:
+        result = game_engines.play(game_id, engine_path, board, ENGINE_LIMIT, bot_type) if bound else None
+        source = "bound"
+        if result is None:
+            source = "engine"
+            with get_pool(engine_path).engine() as engine:
+                result = engine.play(board, ENGINE_LIMIT, info=chess.engine.INFO_SCORE)
+    except Exception:
+        engine_errors.inc(bot=bot_type)
+        raise
+    engine_calls.observe(time.perf_counter() - started, bot=bot_type)
+    engine_replies.inc(bot=bot_type, source=source)
+    score = result.info.get("score")
+    position_cache.put(board, bot_type, limit_key(ENGINE_LIMIT),
+                       CachedReply(result.move, score.white().score(mate_score=MATE_SCORE) if score else None, 0))
+    return result.move
+
+
+def make_deuterium_move(board: chess.Board, game_id: Optional[str] = None) -> str:
+    move = play_engine_move(DEUTERIUM_PATH, board, game_id)
     board.push(move)
-    return f"MinMax algorithm based Bot made: {move}"
-
-
-def make_deuterium_move(board: chess.Board) -> str:
-    book_path = os.path.join(current_dir, "books", "Deuterium_v2019.2.37.73_64bit.bin")
-    engine = chess.engine.SimpleEngine.popen_uci(book_path)
-    move = engine.play(board, chess.engine.Limit(time=0.1))
-    board.push(move.move)
-    return f"Deuterium  algorithm based Bot made: {move.move}"
+    return bot_move_message("deuterium", move)
 
 
-def make_cdrill_move(board: chess.Board) -> str:
-    book_path = os.path.join(current_dir, "books", "cdrill_2000.bin")
-    engine = chess.engine.SimpleEngine.popen_uci(book_path)
-    move = engine.play(board, chess.engine.Limit(time=0.1))
-    board.push(move.move)
-    return f"CDrill algorithm based Bot made: {move.move}"
+def make_cdrill_move(board: chess.Board, game_id: Optional[str] = None) -> str:
+    move = play_engine_move(CDRILL_PATH, board, game_id)
+    board.push(move)
+    return bot_move_message("cdrill", move)
 
 
-def make_stockfish_move(board: chess.Board) -> str:
-    book_path = os.path.join(current_dir, "books", "stockfish/stockfish-ubuntu-x86-64-sse41-popcnt")
-    engine = chess.engine.SimpleEngine.popen_uci(book_path)
-    move = engine.play(board, chess.engine.Limit(time=0.1))
-    board.push(move.move)
-    return f"Stockfish  algorithm based Bot made: {move.move}"
+def make_stockfish_move(board: chess.Board, game_id: Optional[str] = None) -> str:
+    move = play_engine_move(STOCKFISH_PATH, board, game_id)
+    board.push(move)
+    return bot_move_message("stockfish", move)
 
 
 
@@ -0,0 +1,114 @@
+import re
+import uuid
+from datetime import datetime
+from typing import IO, Iterator, List, Optional
+
+import chess
+import chess.pgn
+
+from game_state import GameState
+
+
+# Move times travel as a comment command after each move, e.g. {[%ts 1760000000.123456]}.
+TIMESTAMP_REGEX = re.compile(r"\[%ts\s+([0-9.]+)\]")
+
+DECISIVE_RESULTS = ("1-0", "0-1", "1/2-1/2")
+
+
+def game_to_pgn(game_state: GameState) -> str:
+    game = chess.pgn.Game.from_board(game_state.board)
+    game.headers["Event"] = "PyChess game"
+    game.headers["Site"] = "PyChess"
+    stamps = game_state.move_history.stamps
+    if len(stamps):
+        game.headers["Date"] = datetime.fromtimestamp(stamps[0]).strftime("%Y.%m.%d")
+    game.headers["White"] = game_state.player1
+    game.headers["Black"] = game_state.player2
+    game.headers["Result"] = game_state.result or "*"
+    game.headers["GameId"] = game_state.game_id
+    game.headers["VsBot"] = "1" if game_state.is_vs_bot else "0"
+    game.headers["SuggestionCredit"] = str(game_state.suggestion_credit)
+    if len(stamps) == len(game_state.board.move_stack):
+        for node, stamp in zip(game.mainline(), stamps):
+            node.comment = f"[%ts {stamp:.6f}]"
+    return game.accept(chess.pgn.StringExporter(columns=80)) + "\n\n"
+
+
+# Collects what a GameState needs while read_game parses. The moves are pushed on the
+# parser's own board, which becomes the game's board: no game tree, no board copies.
+class GameStateBuilder(chess.pgn.BaseVisitor):
+    def begin_game(self) -> None:
+        self.headers = {}
+        self.board: Optional[chess.Board] = None
+        self.stamps: List[Optional[float]] = []
+        self.errors: List[str] = []
+        # The termination marker after the mainline, for games with no usable Result tag.
+        self.movetext_result: Optional[str] = None
+
+    def visit_header(self, tagname: str, tagvalue: str) -> None:
+        self.headers[tagname] = tagvalue
+
+    def visit_board(self, board: chess.Board) -> None:
+        if self.board is None:
+            self.board = board
+
+    def begin_variation(self):
+        return chess.pgn.SKIP
+
+    def visit_move(self, board: chess.Board, move: chess.Move) -> None:
+        self.stamps.append(None)
+
+    def visit_comment(self, comment: str) -> None:
+        match = TIMESTAMP_REGEX.search(comment)
+        if match and self.stamps:
+            self.stamps[-1] = float(match.group(1))
+
+    def visit_result(self, result: str) -> None:
+        self.movetext_result = result
+
+    def handle_error(self, error: Exception) -> None:
+        self.errors.append(str(error))
+
+    def result(self) -> "GameStateBuilder":
+        return self
+
+    def game_state(self, keep_id: bool = False) -> GameState:
+        if self.errors:
+            raise ValueError(self.errors[0])
+        if self.board is None:
+            raise ValueError("Game has no starting position.")
+        headers = self.headers
+        game_id = headers.get("GameId") if keep_id and headers.get("GameId") else str(uuid.uuid4())
+        # "?" is PGN for unknown; the GameState defaults stand in for it.
+        player1 = headers.get("White") if headers.get("White") != "?" else None
+        player2 = headers.get("Black") if headers.get("Black") != "?" else None
+        game_state = GameState(game_id, is_vs_bot=headers.get("VsBot") == "1",
+                               player1=player1, player2=player2, board=self.board)
+        if headers.get("SuggestionCredit", "").isdigit():
+            game_state.suggestion_credit = int(headers["SuggestionCredit"])
+        stamps = self.stamps if None not in self.stamps else None
+        game_state.load_board_moves(stamps)
+        # Resignations and the like leave no trace on the board; the Result tag keeps them,
+        # or the marker ending the movetext when the tag is missing or "*".
+        result = headers.get("Result")
+        if result not in DECISIVE_RESULTS:
+            result = self.movetext_result
+        if game_state.result is None and result in DECISIVE_RESULTS:
+            game_state.has_game_over = True
+            game_state.result = result
+            game_state.is_game_draw = game_state.result == "1/2-1/2"
+            game_state.bump_version()
+        return game_state
+
+
+# Yields (game_state, None) or (None, error) for each game in the stream, reading one
+# game at a time so files of any size are imported in constant memory.
+def read_game_states(handle: IO[str], keep_ids: bool = False) -> Iterator[tuple]:
+    while True:
+        builder = chess.pgn.read_game(handle, Visitor=GameStateBuilder)
+        if builder is None:
+            return
+        try:
+            yield builder.game_state(keep_ids), None
+        except ValueError as e:
+            yield None, str(e)
@@ -1,51 +1,70 @@
-from typing import Optional, List, Any
+from typing import Optional, List, Union
+from array import array
+import bisect
 import chess
+import chess.polyglot
+import json
+import time
 from datetime import datetime
 
 import chess
 
-def evaluate_board(board: chess.Board) -> dict:
-    piece_values = {
-        chess.PAWN: 1,
-        chess.KNIGHT: 3,
-        chess.BISHOP: 3,
-        chess.ROOK: 5,
-        chess.QUEEN: 9,
-        chess.KING: 0,  
-    }
+piece_values = {
+    chess.PAWN: 1,
+    chess.KNIGHT: 3,
+    chess.BISHOP: 3,
+    chess.ROOK: 5,
+    chess.QUEEN: 9,
+    chess.KING: 0,
+}
 
-    # Initialize scores
-    white_score, black_score = 0, 0
 
-    # Piece counters
-    white_pieces = {chess.PAWN: 0, chess.KNIGHT: 0, chess.BISHOP: 0, chess.ROOK: 0, chess.QUEEN: 0, chess.KING: 0}
-    black_pieces = {chess.PAWN: 0, chess.KNIGHT: 0, chess.BISHOP: 0, chess.ROOK: 0, chess.QUEEN: 0, chess.KING: 0}
+def material_score(pieces: dict) -> int:
+    return sum(piece_values[piece_type] * count for piece_type, count in pieces.items())
 
-    for square in chess.SQUARES:
-        piece = board.piece_at(square)
-        if piece:
-            piece_value = piece_values.get(piece.piece_type, 0)
-            if piece.color == chess.WHITE:
-                white_score += piece_value
-                white_pieces[piece.piece_type] += 1
-            else:
-                black_score += piece_value
-                black_pieces[piece.piece_type] += 1
 
-    # Calculate total pieces left for each color
-    white_piece_count = sum(white_pieces.values())
-    black_piece_count = sum(black_pieces.values())
+def evaluate_board(board: chess.Board) -> dict:
+    # Piece counters, one popcount per piece bitboard
+    white_pieces = {}
+    black_pieces = {}
+    for piece_type in chess.PIECE_TYPES:
+        mask = board.pieces_mask(piece_type, chess.WHITE) | board.pieces_mask(piece_type, chess.BLACK)
+        white_pieces[piece_type] = (mask & board.occupied_co[chess.WHITE]).bit_count()
+        black_pieces[piece_type] = (mask & board.occupied_co[chess.BLACK]).bit_count()
 
     return {
-        "w_score": white_score,
-        "b_score": black_score,
-        "w_pieces": white_piece_count,
-        "b_pieces": black_piece_count,
+        "w_score": material_score(white_pieces),
+        "b_score": material_score(black_pieces),
+        "w_pieces": board.occupied_co[chess.WHITE].bit_count(),
+        "b_pieces": board.occupied_co[chess.BLACK].bit_count(),
         "w_piece_details": white_pieces,
         "b_piece_details": black_pieces
     }
 
 
+def piece_masks(board: chess.Board) -> tuple:
+    return board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings
+
+
+# The piece type (if any) the move just pushed took, read off the piece bitboards
+# of the position before it.
+def captured_piece_type(move: chess.Move, masks_before: tuple, mover: chess.Color) -> Optional[chess.PieceType]:
+    target = chess.BB_SQUARES[move.to_square]
+    occupied_before = 0
+    for mask in masks_before:
+        occupied_before |= mask
+    if not occupied_before & target:
+        if not masks_before[0] & chess.BB_SQUARES[move.from_square] or \
+                chess.square_file(move.from_square) == chess.square_file(move.to_square):
+            return None
+        # En passant: the pawn taken sits behind the target square.
+        target = chess.BB_SQUARES[move.to_square - 8 if mover == chess.WHITE else move.to_square + 8]
+    for piece_type, mask in zip(chess.PIECE_TYPES, masks_before):
+        if mask & target:
+            return piece_type
+    return None
+
+
 
 def calculate_move_value(move: chess.Move) -> int:
     if move.is_capture():
@@ -55,25 +74,224 @@ def calculate_move_value(move: chess.Move) -> int:
     return 0
 
 
+# One packed code per ply: from square, to square, promotion piece and the recorded colour bit.
+def pack_move(move: chess.Move, color: chess.Color) -> int:
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12 | color << 15
+
+
+def unpack_move(code: int) -> chess.Move:
+    return chess.Move(code & 63, code >> 6 & 63, code >> 12 & 7 or None)
+
+
+# The move history in typed arrays, two bytes of move and eight of timestamp and
+# version per ply; the dicts clients see are only built when asked for.
+class MoveHistory:
+    __slots__ = ("codes", "stamps", "versions")
+
+    def __init__(self):
+        self.codes = array("H")
+        self.stamps = array("d")
+        # Version of the game at which each ply was added.
+        self.versions = array("L")
+
+    def append(self, move: chess.Move, color: chess.Color, version: int, stamp: Optional[float] = None) -> None:
+        self.codes.append(pack_move(move, color))
+        self.stamps.append(time.time() if stamp is None else stamp)
+        self.versions.append(version)
+
+    def append_code(self, code: int, version: int, stamp: float) -> None:
+        self.codes.append(code)
+        self.stamps.append(stamp)
+        self.versions.append(version)
+
+    # The newest (code, stamp), removed.
+    def pop_entry(self) -> tuple:
+        self.versions.pop()
+        return self.codes.pop(), self.stamps.pop()
+
+    def pop(self) -> chess.Color:
+        return bool(self.pop_entry()[0] >> 15)
+
+    def peek_code(self) -> Optional[int]:
+        return self.codes[-1] if self.codes else None
+
+    def clear(self) -> None:
+        del self.codes[:], self.stamps[:], self.versions[:]
+
+    def added_after(self, version: int) -> int:
+        return bisect.bisect_right(self.versions, version)
+
+    def to_dicts(self, player1: str, player2: str, start: int = 0) -> List[dict]:
+        return [
+            {
+                "move": unpack_move(code).uci(),
+                "player": player1 if code >> 15 else player2,
+                "color": "White" if code >> 15 else "Black",
+                "ts": datetime.fromtimestamp(stamp).isoformat(),
+            }
+            for code, stamp in zip(self.codes[start:], self.stamps[start:])
+        ]
+
+    def to_record(self) -> dict:
+        return {"codes": self.codes.tolist(), "stamps": self.stamps.tolist(), "versions": self.versions.tolist()}
+
+    @classmethod
+    def from_record(cls, record: dict) -> "MoveHistory":
+        history = cls()
+        history.codes.extend(record["codes"])
+        history.stamps.extend(record["stamps"])
+        history.versions.extend(record["versions"])
+        return history
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+ZOBRIST_KEYS = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+_zobrist = chess.polyglot.ZobristHasher(ZOBRIST_KEYS)
+
+
+# Per colour and piece type, in the order of the Polyglot Zobrist keys (black first).
+def colored_masks(board: chess.Board) -> tuple:
+    black, white = board.occupied_co
+    return (board.pawns & black, board.pawns & white, board.knights & black, board.knights & white,
+            board.bishops & black, board.bishops & white, board.rooks & black, board.rooks & white,
+            board.queens & black, board.queens & white, board.kings & black, board.kings & white)
+
+
+def _ep_key(board: chess.Board) -> int:
+    # Repetition only counts an en passant square that can really be taken; Polyglot
+    # hashes it as soon as a pawn stands next to the double-stepped one.
+    if board.ep_square is None or not board.has_legal_en_passant():
+        return 0
+    return _zobrist.hash_ep_square(board)
+
+
+# How often each position of the game has occurred, keyed on its Polyglot Zobrist hash,
+# with one key per ply. A move updates the hash from the bitboards that changed, so
+# fivefold repetition is a dict lookup instead of a replay of the move stack.
+class PositionCounts:
+    __slots__ = ("keys", "counts", "masks", "castling", "ep")
+
+    def __init__(self):
+        self.keys = array("Q")
+        self.counts = {}
+        # Parts of the newest position's hash, to update it from on the next move.
+        self.masks = ()
+        self.castling = 0
+        self.ep = 0
+
+    def _top(self, board: chess.Board) -> None:
+        self.masks = colored_masks(board)
+        self.castling = _zobrist.hash_castling(board)
+        self.ep = _ep_key(board)
+
+    def _add(self, key: int) -> None:
+        self.keys.append(key)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def rebuild(self, board: chess.Board) -> None:
+        self.keys = array("Q")
+        self.counts = {}
+        replay = board.root()
+        self._top(replay)
+        self._add(_zobrist.hash_board(replay) ^ self.castling ^ self.ep ^ _zobrist.hash_turn(replay))
+        for move in board.move_stack:
+            replay.push(move)
+            self.advance(replay)
+
+    # Adds the position just reached by one move from the newest one.
+    def advance(self, board: chess.Board) -> None:
+        key = self.keys[-1] ^ ZOBRIST_KEYS[780]
+        masks = colored_masks(board)
+        for index, (before, after) in enumerate(zip(self.masks, masks)):
+            changed = before ^ after
+            while changed:
+                square = (changed & -changed).bit_length() - 1
+                key ^= ZOBRIST_KEYS[64 * index + square]
+                changed &= changed - 1
+        castling = _zobrist.hash_castling(board)
+        ep = _ep_key(board)
+        key ^= self.castling ^ castling ^ self.ep ^ ep
+        self.masks, self.castling, self.ep = masks, castling, ep
+        self._add(key)
+
+    def retreat(self, board: chess.Board) -> None:
+        key = self.keys.pop()
+        self.counts[key] -= 1
+        if not self.counts[key]:
+            del self.counts[key]
+        self._top(board)
+
+    # Brings the table up to the board: one move pushed or popped since the last call is
+    # applied incrementally, anything else (a reset, a restored game) is replayed.
+    def sync(self, board: chess.Board) -> None:
+        positions = len(board.move_stack) + 1
+        if len(self.keys) == positions - 1 and self.keys:
+            self.advance(board)
+        elif len(self.keys) == positions + 1:
+            self.retreat(board)
+        elif len(self.keys) != positions or self.masks != colored_masks(board):
+            self.rebuild(board)
+
+    def repetitions(self) -> int:
+        return self.counts[self.keys[-1]] if self.keys else 1
+
+
+# Everything a storage backend needs besides the board itself.
+PERSISTED_FIELDS = (
+    "is_vs_bot",
+    "player1",
+    "player2",
+    "game_started",
+    "has_game_over",
+    "is_game_draw",
+    "result",
+    "move_history",
+    "redo_history",
+    "suggestion_credit",
+    "player1_score",
+    "player2_score",
+    "current_turn",
+    "white_pieces_left",
+    "black_pieces_left",
+    "white_pieces_details",
+    "black_pieces_details",
+    "white_piece_moves",
+    "black_piece_moves",
+    "version",
+    "field_versions",
+    "truncations",
+)
+
+# How many undos a delta can reach back over before the client is sent the full game.
+MAX_TRUNCATIONS = 64
+
+
 class GameState:
+    __slots__ = ("game_id", "board", "_published", "_scored_ply", "_scored_masks", "_positions") + PERSISTED_FIELDS
+
     def __init__(
         self,
         game_id: str,
         is_vs_bot: bool = False,
         player1: Optional[str] = None,
         player2: Optional[str] = None,
-        board: chess.Board = chess.Board()
+        board: Optional[chess.Board] = None
     ):
         self.game_id = game_id
         self.is_vs_bot = is_vs_bot
         self.player1 = player1 or "Player 1"
         self.player2 = (player2 or "Player 2") if not is_vs_bot else "Computer"
-        self.board = board
+        # A fresh board per game: a chess.Board() default argument would be shared by all games.
+        self.board = board if board is not None else chess.Board()
         self.game_started = False
         self.has_game_over = False
         self.is_game_draw = False
         self.result = None
-        self.move_history: List[Any] = []
+        self.move_history = MoveHistory()
+        # Undone moves, the next one to redo last; playing any other move clears it.
+        self.redo_history = MoveHistory()
         self.suggestion_credit = 10
         self.player1_score = 0
         self.player2_score = 0
@@ -82,62 +300,220 @@ class GameState:
         self.black_pieces_left = 0
         self.white_pieces_details = {}
         self.black_pieces_details = {}
+        self.white_piece_moves = 0
+        self.black_piece_moves = 0
+        # Ply and piece bitboards the scores above were last computed for; -1 forces a full recompute.
+        self._scored_ply = -1
+        self._scored_masks = ()
+        # Rebuilt from the move stack on first use, e.g. after a game is loaded.
+        self._positions = PositionCounts()
+        # Bumped on every change, so clients can ask for what changed since the version they hold.
+        self.version = 0
+        # Version at which each top-level get_json field last changed.
+        self.field_versions = {}
+        # (version, remaining length) for every undo, newest last.
+        self.truncations: List[List[int]] = []
+        self._published = self._state_fields()
 
     def start_game(self) -> None:
         self.game_started = True
+        self.bump_version()
 
     def end_game(self) -> None:
         self.has_game_over = True
         self.result = self.calculate_game_result()
+        self.bump_version()
 
     def is_game_drawn(self) -> bool:
-        return self.board.is_insufficient_material() or self.board.is_seventyfive_moves() or self.board.is_fivefold_repetition()
+        self._positions.sync(self.board)
+        return self.board.is_insufficient_material() or self.board.halfmove_clock >= 150 or \
+            self._positions.repetitions() >= 5
 
+    # The same verdict as board.outcome(), from a single legal move check, with fivefold
+    # repetition read off the position counts.
     def calculate_game_result(self) -> Optional[str]:
-        # Checkmate
-        if self.board.is_checkmate():
-            return "1-0" if self.board.turn == chess.BLACK else "0-1"
+        board = self.board
+        self._positions.sync(board)
+        if not any(board.generate_legal_moves()):
+            # Checkmate
+            if board.is_check():
+                return "1-0" if board.turn == chess.BLACK else "0-1"
+            # Stalemate
+            self.is_game_draw = True
+            return "1/2-1/2"
         # Draw conditions
-        if self.board.is_stalemate() or self.is_game_drawn():
+        if self.is_game_drawn():
             self.is_game_draw = True
             return "1/2-1/2"
         # No result yet
         return None
 
     def update_game_state(self) -> None:
-        self.has_game_over = self.board.is_game_over() or self.is_game_drawn()
         self.result = self.calculate_game_result()
+        self.has_game_over = self.result is not None
+
+    # Records the move just pushed on the board. Callers pass their result message; the
+    # history keeps the board's own last move instead, unless given a chess.Move.
+    def add_move(self, move: Union[chess.Move, str, None] = None) -> None:
+        if not isinstance(move, chess.Move):
+            move = self.board.peek() if self.board.move_stack else chess.Move.null()
+        color = self.board.turn
+        # Replaying the next undone move keeps the rest of the redo line; any other move drops it.
+        if self.redo_history.peek_code() == pack_move(move, color):
+            self.redo_history.pop_entry()
+        else:
+            self.redo_history.clear()
 
-    def add_move(self, move: chess.Move) -> None:
-        move_data = self.create_move_data(move)
+        self.update_scores(move)
+        self.move_history.append(move, color, self.version + 1)
+        self._count_move(color, 1)
+        self.update_game_state()
+        self.bump_version()
+
+    def _count_move(self, color: chess.Color, step: int) -> None:
+        if color == chess.WHITE:
+            self.white_piece_moves += step
+        else:
+            self.black_piece_moves += step
 
+    # Takes back up to count moves, board and history together, and keeps them for
+    # redo_moves. Each ply is a pop of the board's own stack, so nothing is replayed.
+    # Returns how many were undone.
+    def undo_moves(self, count: int = 1) -> int:
+        count = min(count, len(self.board.move_stack), len(self.move_history))
+        if count <= 0:
+            return 0
+        for _ in range(count):
+            self.board.pop()
+            self._positions.sync(self.board)
+            code, stamp = self.move_history.pop_entry()
+            self.redo_history.append_code(code, self.version + 1, stamp)
+            self._count_move(bool(code >> 15), -1)
+        self.truncations.append([self.version + 1, len(self.move_history)])
+        del self.truncations[:-MAX_TRUNCATIONS]
+        self.is_game_draw = False
         self.update_scores()
-        self.move_history.append(move_data)
         self.update_game_state()
+        self.bump_version()
+        return count
 
-    def create_move_data(self, move: chess.Move) -> dict:
-        player = self.player1 if self.board.turn == chess.WHITE else self.player2
-        color = "White" if self.board.turn == chess.WHITE else "Black"
-        return {
-            "move": str(move),
-            "player": player,
-            "color": color,
-            "ts": datetime.now().isoformat(),
-        }
+    # Plays back up to count undone moves with their original timestamps. Returns how many
+    # were redone; a redo line the board no longer matches is dropped.
+    def redo_moves(self, count: int = 1) -> int:
+        if count <= 0 or not len(self.redo_history):
+            return 0
+        done = 0
+        while done < count and len(self.redo_history):
+            code, stamp = self.redo_history.pop_entry()
+            move = unpack_move(code)
+            if not self.board.is_legal(move):
+                self.redo_history.clear()
+                break
+            self.board.push(move)
+            self._positions.sync(self.board)
+            self.move_history.append_code(code, self.version + 1, stamp)
+            self._count_move(bool(code >> 15), 1)
+            done += 1
+        if done:
+            self.is_game_draw = False
+            self.update_scores()
+            self.update_game_state()
+        self.bump_version()
+        return done
+
+    # Moves to the position after ply moves, back through the board's stack or forward
+    # along the redo line.
+    def jump_to_ply(self, ply: int) -> int:
+        current = len(self.board.move_stack)
+        if not 0 <= ply <= current + len(self.redo_history):
+            raise ValueError(f"Ply must be between 0 and {current + len(self.redo_history)}.")
+        if ply < current:
+            self.undo_moves(current - ply)
+        elif ply > current:
+            self.redo_moves(ply - current)
+        return len(self.board.move_stack)
+
+    # Back to the starting position with an empty history and nothing to redo.
+    def reset(self) -> None:
+        self.board.reset()
+        self.move_history.clear()
+        self.redo_history.clear()
+        self.white_piece_moves = 0
+        self.black_piece_moves = 0
+        self.truncations.append([self.version + 1, 0])
+        del self.truncations[:-MAX_TRUNCATIONS]
+        self.is_game_draw = False
+        self.update_scores()
+        self.update_game_state()
+        self.bump_version()
+
+    # Rebuilds history, move counters and scores for moves that were pushed on the board
+    # without going through add_move, e.g. by a PGN reader. Same colour bit as add_move.
+    def load_board_moves(self, stamps: Optional[List[float]] = None) -> None:
+        moves = self.board.move_stack
+        color = self.board.turn if len(moves) % 2 == 0 else not self.board.turn
+        self.move_history.clear()
+        self.redo_history.clear()
+        self.white_piece_moves = 0
+        self.black_piece_moves = 0
+        for ply, move in enumerate(moves):
+            color = not color
+            stamp = stamps[ply] if stamps is not None and ply < len(stamps) else None
+            self.move_history.append(move, color, self.version + 1, stamp)
+            if color == chess.WHITE:
+                self.white_piece_moves += 1
+            else:
+                self.black_piece_moves += 1
+        self.game_started = True
+        self.update_scores()
+        self.update_game_state()
+        self.bump_version()
 
-    def update_scores(self) -> None:
-        board_value = evaluate_board(self.board)
-        self.player1_score = board_value.get("w_score", 0)
-        self.player2_score = board_value.get("b_score", 0)
-        self.white_pieces_left = board_value.get("w_pieces", 0)
-        self.black_pieces_left = board_value.get("b_pieces", 0)
-        self.white_pieces_details = board_value.get("w_piece_details", {})
-        self.black_pieces_details = board_value.get("b_piece_details", {})
-        self.current_turn = self.board.turn
+    # Given the move just pushed, only what it captured or promoted is applied to the
+    # previous counts; otherwise (reset, undo, moves pushed unscored) they are recounted.
+    def update_scores(self, move: Optional[chess.Move] = None) -> None:
+        board = self.board
+        if move and self._scored_ply == len(board.move_stack) - 1:
+            mover = not board.turn
+            own = dict(self.white_pieces_details if mover == chess.WHITE else self.black_pieces_details)
+            other = dict(self.black_pieces_details if mover == chess.WHITE else self.white_pieces_details)
+            if move.promotion:
+                own[chess.PAWN] -= 1
+                own[move.promotion] += 1
+            captured = captured_piece_type(move, self._scored_masks, mover)
+            if captured:
+                other[captured] -= 1
+            white, black = (own, other) if mover == chess.WHITE else (other, own)
+            self.player1_score = material_score(white)
+            self.player2_score = material_score(black)
+            self.white_pieces_left = sum(white.values())
+            self.black_pieces_left = sum(black.values())
+            self.white_pieces_details = white
+            self.black_pieces_details = black
+        else:
+            board_value = evaluate_board(board)
+            self.player1_score = board_value.get("w_score", 0)
+            self.player2_score = board_value.get("b_score", 0)
+            self.white_pieces_left = board_value.get("w_pieces", 0)
+            self.black_pieces_left = board_value.get("b_pieces", 0)
+            self.white_pieces_details = board_value.get("w_piece_details", {})
+            self.black_pieces_details = board_value.get("b_piece_details", {})
+        self.current_turn = board.turn
+        self._scored_ply = len(board.move_stack)
+        self._scored_masks = piece_masks(board)
 
     def update_credit(self) -> None:
         if self.suggestion_credit > 0:
             self.suggestion_credit -= 1
+        self.bump_version()
+
+    def bump_version(self) -> None:
+        self.version += 1
+        fields = self._state_fields()
+        for key, value in fields.items():
+            if self._published.get(key) != value:
+                self.field_versions[key] = self.version
+        self._published = fields
 
     def get_game_status_message(self) -> str:
         if self.has_game_over:
@@ -163,15 +539,14 @@ class GameState:
         current_turn_color = "White" if self.board.turn == chess.WHITE else "Black"
         return f"The game is ongoing. It's {current_turn_player}'s turn ({current_turn_color})."
 
-    def get_json(self) -> dict:
+    # Everything get_json reports except the move history.
+    def _state_fields(self) -> dict:
         return {
-            "game_id": self.game_id,
             "is_vs_bot": self.is_vs_bot,
             "player1": self.player1,
             "player2": self.player2,
             "game_started": self.game_started,
             "has_game_over": self.has_game_over,
-            "move_history": self.move_history,
             "current_turn": self.current_turn,
             "white_score": self.player1_score,
             "black_score": self.player2_score,
@@ -181,6 +556,70 @@ class GameState:
             "black_pieces_left": self.black_pieces_left,
             "white_pieces_details": self.white_pieces_details,
             "black_pieces_details": self.black_pieces_details,
-            "white_piece_moves":sum(1 for move in self.move_history if move.get("color") == "White"),
-            "black_piece_moves":sum(1 for move in self.move_history if move.get("color") == "Black"),
+            "white_piece_moves": self.white_piece_moves,
+            "black_piece_moves": self.black_piece_moves,
+            "redo_moves": len(self.redo_history),
+        }
+
+    def get_move_history(self, start: int = 0) -> List[dict]:
+        return self.move_history.to_dicts(self.player1, self.player2, start)
+
+    def _moves_changed_from(self, since: int) -> int:
+        start = self.move_history.added_after(since)
+        for version, length in reversed(self.truncations):
+            if version <= since:
+                break
+            start = min(start, length)
+        return start
+
+    # With since set to a version the client already holds, only the moves and fields that
+    # changed after it are returned; the client drops its history from moves_from onward and
+    # appends moves. Unknown or too old versions get the full game.
+    def get_json(self, since: Optional[int] = None) -> dict:
+        oldest = self.truncations[0][0] if len(self.truncations) == MAX_TRUNCATIONS else 0
+        if since is None or not oldest <= since <= self.version:
+            game_json = {"game_id": self.game_id, "version": self.version, "move_history": self.get_move_history()}
+            game_json.update(self._state_fields())
+            return game_json
+
+        start = self._moves_changed_from(since)
+        game_json = {
+            "game_id": self.game_id,
+            "version": self.version,
+            "since": since,
+            "moves_from": start,
+            "moves": self.get_move_history(start),
         }
+        fields = self._state_fields()
+        for key, version in self.field_versions.items():
+            if version > since:
+                game_json[key] = fields[key]
+        return game_json
+
+    def to_record(self) -> dict:
+        root = self.board.root()
+        state = {field: getattr(self, field) for field in PERSISTED_FIELDS}
+        state["move_history"] = self.move_history.to_record()
+        state["redo_history"] = self.redo_history.to_record()
+        return {
+            "game_id": self.game_id,
+            "root_fen": root.fen(),
+            "moves": " ".join(move.uci() for move in self.board.move_stack),
+            "fen": self.board.fen(),
+            "state": json.dumps(state),
+        }
+
+    @classmethod
+    def from_record(cls, record: dict) -> "GameState":
+        board = chess.Board(record["root_fen"])
+        for uci in record["moves"].split():
+            board.push_uci(uci)
+        game_state = cls(record["game_id"], board=board)
+        for field, value in json.loads(record["state"]).items():
+            if field in ("white_pieces_details", "black_pieces_details"):
+                value = {int(piece_type): count for piece_type, count in value.items()}
+            elif field in ("move_history", "redo_history"):
+                value = MoveHistory.from_record(value)
+            setattr(game_state, field, value)
+        game_state._published = game_state._state_fields()
+        return game_state
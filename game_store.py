@@ -0,0 +1,459 @@
+import atexit
+import os
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+from game_state import GameState
+from sqlite_connections import ThreadConnections
+
+
+GAME_SHARDS = int(os.environ.get("PYCHESS_GAME_SHARDS", "16"))
+GAME_TTL = float(os.environ.get("PYCHESS_GAME_TTL", "3600"))
+MAX_GAMES = int(os.environ.get("PYCHESS_MAX_GAMES", "10000"))
+
+GAME_CACHE_SIZE = int(os.environ.get("PYCHESS_GAME_CACHE_SIZE", "2000"))
+GAME_ROW_TTL = float(os.environ.get("PYCHESS_GAME_ROW_TTL", str(7 * 24 * 3600)))
+WRITE_BATCH_SIZE = int(os.environ.get("PYCHESS_GAME_WRITE_BATCH", "64"))
+FLUSH_INTERVAL = float(os.environ.get("PYCHESS_GAME_FLUSH_INTERVAL", "0.05"))
+REVALIDATE_AFTER = float(os.environ.get("PYCHESS_GAME_CACHE_REVALIDATE", "1.0"))
+# How often the flusher drops idle games from the cache and rows older than the row TTL.
+EVICT_INTERVAL = float(os.environ.get("PYCHESS_GAME_EVICT_INTERVAL", "60"))
+
+
+class _Entry:
+    __slots__ = ("game_state", "lock", "last_access", "revision", "checked_at")
+
+    def __init__(self, game_state: GameState, revision: int = 0):
+        self.game_state = game_state
+        # Serializes every request that reads or mutates this one game.
+        self.lock = threading.RLock()
+        self.last_access = time.monotonic()
+        # Backend revision of the copy held here (0 before its first write), and when it
+        # was last compared to the backend.
+        self.revision = revision
+        self.checked_at = self.last_access
+
+
+class _Shard:
+    __slots__ = ("lock", "entries")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Least recently used first, so idle games are found at the front.
+        self.entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+
+# The in-memory store. Persistent backends subclass it and use the same sharded
+# structure as their cache, filling misses through _load and writing through save.
+class GameStore:
+    def __init__(self, shards: int = GAME_SHARDS, ttl: float = GAME_TTL, max_games: int = MAX_GAMES):
+        self.ttl = ttl
+        self._shards = [_Shard() for _ in range(max(1, shards))]
+        self.max_per_shard = max(1, max_games // len(self._shards))
+        self.evicted = 0
+        # Called with the id of each game dropped from memory, under its shard lock,
+        # so they must not block.
+        self.evict_listeners: List[Callable[[str], None]] = []
+
+    def _evicted(self, game_id: str) -> None:
+        self.evicted += 1
+        for listener in self.evict_listeners:
+            listener(game_id)
+
+    def _shard(self, game_id: str) -> _Shard:
+        return self._shards[hash(game_id) % len(self._shards)]
+
+    def _evict(self, shard: _Shard, now: float) -> None:
+        # Caller holds shard.lock. Games with a request in flight are skipped.
+        for game_id in list(shard.entries):
+            entry = shard.entries[game_id]
+            expired = now - entry.last_access > self.ttl
+            if not expired and len(shard.entries) <= self.max_per_shard:
+                break
+            if not entry.lock.acquire(blocking=False):
+                continue
+            try:
+                del shard.entries[game_id]
+                self._evicted(game_id)
+            finally:
+                entry.lock.release()
+
+    def add(self, game_state: GameState) -> None:
+        shard = self._shard(game_state.game_id)
+        now = time.monotonic()
+        with shard.lock:
+            shard.entries[game_state.game_id] = _Entry(game_state)
+            self._evict(shard, now)
+
+    def _load(self, game_id: str) -> Optional[_Entry]:
+        return None
+
+    def _entry(self, game_id: str) -> Optional[_Entry]:
+        shard = self._shard(game_id)
+        now = time.monotonic()
+        with shard.lock:
+            entry = shard.entries.get(game_id)
+            if entry is not None and now - entry.last_access > self.ttl:
+                del shard.entries[game_id]
+                self._evicted(game_id)
+                entry = None
+            if entry is not None:
+                entry.last_access = now
+                shard.entries.move_to_end(game_id)
+                return entry
+
+        loaded = self._load(game_id)
+        if loaded is None:
+            return None
+        with shard.lock:
+            # Another request may have loaded the same game meanwhile; keep a single entry.
+            entry = shard.entries.setdefault(game_id, loaded)
+            self._evict(shard, now)
+        return entry
+
+    def get(self, game_id: str) -> Optional[GameState]:
+        entry = self._entry(game_id)
+        return entry.game_state if entry else None
+
+    # Called with the entry locked before the caller may change the game; False when the
+    # game is gone from the backend. Nothing to check in memory.
+    def _refresh(self, game_id: str, entry: _Entry) -> bool:
+        return True
+
+    def _holds(self, game_id: str, entry: _Entry) -> bool:
+        shard = self._shard(game_id)
+        with shard.lock:
+            return shard.entries.get(game_id) is entry
+
+    @contextmanager
+    def locked(self, game_id: str) -> Iterator[Optional[GameState]]:
+        while True:
+            entry = self._entry(game_id)
+            if entry is None:
+                yield None
+                return
+            with entry.lock:
+                # Evicted between the lookup and the lock: a change to this copy would be
+                # lost, so look the game up again.
+                if self._holds(game_id, entry) and self._refresh(game_id, entry):
+                    yield entry.game_state
+                    return
+
+    def save(self, game_state: GameState) -> None:
+        pass
+
+    def delete(self, game_id: str) -> None:
+        shard = self._shard(game_id)
+        with shard.lock:
+            if shard.entries.pop(game_id, None) is not None:
+                self._evicted(game_id)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def evict_idle(self) -> int:
+        before = self.evicted
+        now = time.monotonic()
+        for shard in self._shards:
+            with shard.lock:
+                self._evict(shard, now)
+        return self.evicted - before
+
+    def game_ids(self) -> List[str]:
+        ids = []
+        for shard in self._shards:
+            with shard.lock:
+                ids.extend(shard.entries)
+        return ids
+
+    # A record of every stored game, one at a time, each taken under the game's lock.
+    def iter_records(self) -> Iterator[dict]:
+        for game_id in self.game_ids():
+            with self.locked(game_id) as game_state:
+                record = game_state.to_record() if game_state else None
+            if record is not None:
+                yield record
+
+    # Games held in memory right now; for persistent stores that's the cache, not the table.
+    def live_games(self) -> int:
+        return sum(len(shard.entries) for shard in self._shards)
+
+    def __len__(self) -> int:
+        return self.live_games()
+
+
+##############################################
+#           SQLITE BACKEND                   #
+##############################################
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    game_id TEXT PRIMARY KEY,
+    root_fen TEXT NOT NULL,
+    moves TEXT NOT NULL,
+    fen TEXT NOT NULL,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS games_updated_at ON games (updated_at);
+"""
+
+
+RECORD_COLUMNS = ("game_id", "root_fen", "moves", "fen", "state", "updated_at", "revision")
+
+
+# Writes are batched, but never blindly: each one names the revision it was built on and
+# only applies if the row is still at it, so two worker processes changing the same game
+# can't overwrite each other's moves. The loser's write is dropped and its cached copy
+# reloaded; locked() rereads the row first, which keeps that to changes made within
+# one flush interval of each other.
+class SQLiteGameStore(GameStore):
+    def __init__(
+        self,
+        path: str,
+        cache_size: int = GAME_CACHE_SIZE,
+        batch_size: int = WRITE_BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+        row_ttl: float = GAME_ROW_TTL,
+        revalidate_after: float = REVALIDATE_AFTER,
+        shards: int = GAME_SHARDS,
+        evict_interval: float = EVICT_INTERVAL,
+    ):
+        super().__init__(shards=shards, ttl=GAME_TTL, max_games=cache_size)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.row_ttl = row_ttl
+        self.revalidate_after = revalidate_after
+        self.evict_interval = evict_interval
+        # Readers never wait on the flusher, and several processes can share the file.
+        self._connections = ThreadConnections(path)
+        # game_id -> record waiting to be written, or None for a pending delete.
+        self._pending: Dict[str, Optional[dict]] = {}
+        # The batch being written; still visible to readers until it has committed.
+        self._inflight: Dict[str, Optional[dict]] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        connection = self._connections.get()
+        connection.executescript(SCHEMA)
+        if "revision" not in {row[1] for row in connection.execute("PRAGMA table_info(games)")}:
+            connection.execute("ALTER TABLE games ADD COLUMN revision INTEGER NOT NULL DEFAULT 1")
+        # Writes the backend turned down because another process changed the game first.
+        self.conflicts = 0
+        self._flusher = threading.Thread(target=self._flush_loop, name="game-store-flush", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _fetch(self, game_id: str) -> Optional[dict]:
+        with self._pending_lock:
+            if game_id in self._pending:
+                return self._pending[game_id]
+            if game_id in self._inflight:
+                return self._inflight[game_id]
+        row = self._connections.get().execute(
+            f"SELECT {', '.join(RECORD_COLUMNS)} FROM games WHERE game_id = ?", (game_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(RECORD_COLUMNS, row))
+
+    # The stored revision alone, None when the game is gone: what locked() checks a cached
+    # game against without reading and parsing the whole row.
+    def _revision(self, game_id: str) -> Optional[int]:
+        with self._pending_lock:
+            for writes in (self._pending, self._inflight):
+                if game_id in writes:
+                    record = writes[game_id]
+                    return record["revision"] if record is not None else None
+        row = self._connections.get().execute("SELECT revision FROM games WHERE game_id = ?", (game_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def _load(self, game_id: str) -> Optional[_Entry]:
+        record = self._fetch(game_id)
+        if record is None:
+            return None
+        return _Entry(GameState.from_record(record), record["revision"])
+
+    def _entry(self, game_id: str) -> Optional[_Entry]:
+        entry = super()._entry(game_id)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.checked_at > self.revalidate_after:
+            with entry.lock:
+                if not self._refresh(game_id, entry):
+                    return None
+        return entry
+
+    # Another worker process may have moved this game since it was cached.
+    def _refresh(self, game_id: str, entry: _Entry) -> bool:
+        entry.checked_at = time.monotonic()
+        revision = self._revision(game_id)
+        record = None
+        if revision is not None and revision > entry.revision:
+            record = self._fetch(game_id)
+            if record is None:
+                revision = None
+        if revision is None:
+            self._evict_entry(game_id)
+            return False
+        if record is not None:
+            entry.game_state = GameState.from_record(record)
+            entry.revision = record["revision"]
+        return True
+
+    def _evict_entry(self, game_id: str) -> None:
+        shard = self._shard(game_id)
+        with shard.lock:
+            if shard.entries.pop(game_id, None) is not None:
+                self._evicted(game_id)
+
+    def _stored_revision(self, game_id: str) -> int:
+        return self._revision(game_id) or 0
+
+    # A new game, or an import replacing one under the same id: the write goes on top of
+    # whatever is stored.
+    def add(self, game_state: GameState) -> None:
+        revision = self._stored_revision(game_state.game_id)
+        super().add(game_state)
+        shard = self._shard(game_state.game_id)
+        with shard.lock:
+            entry = shard.entries.get(game_state.game_id)
+            if entry is not None:
+                entry.revision = revision
+        self.save(game_state)
+
+    def save(self, game_state: GameState) -> None:
+        record = game_state.to_record()
+        record["updated_at"] = time.time()
+        shard = self._shard(game_state.game_id)
+        with shard.lock:
+            entry = shard.entries.get(game_state.game_id)
+            if entry is not None:
+                # The revision the write is built on, and the one it creates.
+                record["base"] = entry.revision
+                entry.revision += 1
+                record["revision"] = entry.revision
+        if entry is None:
+            record["base"] = self._stored_revision(game_state.game_id)
+            record["revision"] = record["base"] + 1
+        with self._pending_lock:
+            previous = self._pending.get(game_state.game_id)
+            if previous is not None:
+                # Replaces a write not yet flushed, so it applies on top of what that one was built on.
+                record["base"] = previous["base"]
+            self._pending[game_state.game_id] = record
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def delete(self, game_id: str) -> None:
+        super().delete(game_id)
+        with self._pending_lock:
+            self._pending[game_id] = None
+        self._wakeup.set()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._pending_lock:
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+            if not batch:
+                return
+            deleted = [(game_id,) for game_id, record in batch.items() if record is None]
+            connection = self._connections.get()
+            conflicts = []
+            try:
+                with connection:
+                    for game_id, record in batch.items():
+                        if record is not None and not self._write(connection, record):
+                            conflicts.append(game_id)
+                    connection.executemany("DELETE FROM games WHERE game_id = ?", deleted)
+            except sqlite3.Error:
+                # Put the batch back unless a newer write for the same game arrived meanwhile.
+                with self._pending_lock:
+                    for game_id, record in batch.items():
+                        self._pending.setdefault(game_id, record)
+                raise
+            finally:
+                with self._pending_lock:
+                    self._inflight = {}
+        for game_id in conflicts:
+            self.conflicts += 1
+            with self._pending_lock:
+                # Later writes of the game were built on the dropped one.
+                if self._pending.get(game_id) is not None:
+                    del self._pending[game_id]
+            print(f"Game {game_id} was changed by another process; dropped this process's write.", file=sys.stderr)
+            self._evict_entry(game_id)
+
+    # False when the row has moved past the revision the record was built on.
+    def _write(self, connection: sqlite3.Connection, record: dict) -> bool:
+        values = (record["root_fen"], record["moves"], record["fen"], record["state"], record["updated_at"])
+        if record["base"] == 0:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO games (root_fen, moves, fen, state, updated_at, game_id, revision) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", values + (record["game_id"], record["revision"]))
+        else:
+            cursor = connection.execute(
+                "UPDATE games SET root_fen = ?, moves = ?, fen = ?, state = ?, updated_at = ?, revision = ? "
+                "WHERE game_id = ? AND revision = ?",
+                values + (record["revision"], record["game_id"], record["base"]))
+        return cursor.rowcount == 1
+
+    def _flush_loop(self) -> None:
+        evicted_at = time.monotonic()
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                if time.monotonic() - evicted_at >= self.evict_interval:
+                    evicted_at = time.monotonic()
+                    self.evict_idle()
+            except Exception:
+                traceback.print_exc()
+
+    def evict_idle(self) -> int:
+        evicted = super().evict_idle()
+        with self._connections.get() as connection:
+            connection.execute("DELETE FROM games WHERE updated_at < ?", (time.time() - self.row_ttl,))
+        return evicted
+
+    # Streams the table row by row instead of loading it, so exports run in constant memory.
+    def iter_records(self) -> Iterator[dict]:
+        self.flush()
+        cursor = self._connections.get().execute(f"SELECT {', '.join(RECORD_COLUMNS)} FROM games")
+        for row in cursor:
+            yield dict(zip(RECORD_COLUMNS, row))
+
+    def __len__(self) -> int:
+        self.flush()
+        return self._connections.get().execute("SELECT COUNT(*) FROM games").fetchone()[0]
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._wakeup.set()
+        self._flusher.join()
+        self.flush()
+
+
+def open_game_store(url: str = "") -> GameStore:
+    url = url or os.environ.get("PYCHESS_GAME_STORE", "memory")
+    if url == "memory":
+        return GameStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteGameStore(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported game store: {url}")
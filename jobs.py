@@ -0,0 +1,232 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional
+
+import chess
+
+from game import (BOT_ENGINE_PATHS, SEARCH_WORKERS, SearchResult, minmax_move_for_fen, play_engine_move,
+                  quick_minmax_move, remember_minmax_move)
+from metrics import record_search
+
+
+SEARCH_PROCESSES = int(os.environ.get("PYCHESS_SEARCH_PROCESSES", str(os.cpu_count() or 2)))
+ENGINE_THREADS = int(os.environ.get("PYCHESS_ENGINE_THREADS", "8"))
+JOB_QUEUE_LIMIT = int(os.environ.get("PYCHESS_JOB_QUEUE_LIMIT", "256"))
+JOB_TTL = float(os.environ.get("PYCHESS_JOB_TTL", "300"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, game_id: str, bot_type: str, fen: str):
+        self.job_id = str(uuid.uuid4())
+        self.game_id = game_id
+        self.bot_type = bot_type
+        # Position the bot is thinking about; the result only applies while the game is still there.
+        self.fen = fen
+        self.cancelled = False
+        self.status = QUEUED
+        self.move: Optional[chess.Move] = None
+        self.search: Optional[SearchResult] = None
+        self.message: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created = time.monotonic()
+        self.finished: Optional[float] = None
+        self.future: Optional[Future] = None
+        # Searched in a worker process, whose caches this process doesn't share.
+        self.out_of_process = False
+        self.done = threading.Event()
+
+    def current_status(self) -> str:
+        if self.status == QUEUED and self.future is not None and self.future.running():
+            return RUNNING
+        return self.status
+
+    def to_json(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "game_id": self.game_id,
+            "bot_type": self.bot_type,
+            "status": self.current_status(),
+            "move": self.move.uci() if self.move else None,
+            "result": self.message,
+            "error": self.error,
+        }
+
+
+# Runs bot searches off the request threads: the pure-Python minimax goes to a process
+# pool so it isn't held back by the GIL, UCI engines (which wait on a subprocess) to threads.
+class JobManager:
+    def __init__(
+        self,
+        search_processes: int = SEARCH_PROCESSES,
+        engine_threads: int = ENGINE_THREADS,
+        queue_limit: int = JOB_QUEUE_LIMIT,
+        job_ttl: float = JOB_TTL,
+    ):
+        self.search_processes = max(1, search_processes)
+        self.queue_limit = queue_limit
+        self.job_ttl = job_ttl
+        self._lock = threading.Lock()
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._thread_pool = ThreadPoolExecutor(max(1, engine_threads), thread_name_prefix="bot-job")
+        self._jobs: Dict[str, Job] = {}
+        self._active_by_game: Dict[str, Job] = {}
+        self._outstanding = 0
+        self._completed = 0
+        self._failed = 0
+        self._cancelled = 0
+        self._rejected = 0
+        self._latency_total = 0.0
+
+    def _processes(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            # Spawned rather than forked: the server process holds locks and engine threads.
+            self._process_pool = ProcessPoolExecutor(
+                self.search_processes, mp_context=multiprocessing.get_context("spawn"))
+        return self._process_pool
+
+    def _purge(self, now: float) -> None:
+        for job_id, job in list(self._jobs.items()):
+            if job.finished is not None and now - job.finished > self.job_ttl:
+                del self._jobs[job_id]
+
+    # bound plays engine bots on the game's own engine, for the game's bot moves but not
+    # for suggestions.
+    def submit(self, game_id: str, bot_type: str, board: chess.Board, apply: Callable[[Job], str],
+               bound: bool = False) -> Job:
+        fen = board.fen()
+        quick = quick_minmax_move(board) if bot_type == "minmax" else None
+        superseded = None
+        try:
+            with self._lock:
+                self._purge(time.monotonic())
+                active = self._active_by_game.get(game_id)
+                if active is not None and active.fen == fen and not active.cancelled:
+                    return active
+                if active is not None:
+                    active.cancelled = True
+                    superseded = active.future
+                if self._outstanding >= self.queue_limit:
+                    self._rejected += 1
+                    raise JobQueueFull(f"{self._outstanding} bot moves already queued")
+                job = Job(game_id, bot_type, fen)
+                self._jobs[job.job_id] = job
+                self._active_by_game[game_id] = job
+                self._outstanding += 1
+                if quick is not None:
+                    # Book and cached replies are answered here instead of queueing behind searches.
+                    job.future = Future()
+                    job.future.set_result(quick)
+                elif bot_type == "minmax" and SEARCH_WORKERS > 1:
+                    # The search already fans out to its own worker processes; only wait on it here.
+                    job.future = self._thread_pool.submit(minmax_move_for_fen, fen)
+                elif bot_type == "minmax":
+                    job.out_of_process = True
+                    try:
+                        job.future = self._processes().submit(minmax_move_for_fen, fen)
+                    except BrokenProcessPool:
+                        # A crashed worker poisons the whole executor; start a fresh one.
+                        self._process_pool = None
+                        job.future = self._processes().submit(minmax_move_for_fen, fen)
+                else:
+                    job.future = self._thread_pool.submit(play_engine_move, BOT_ENGINE_PATHS[bot_type],
+                                                          board.copy(), game_id if bound else None)
+        finally:
+            # Outside the lock: cancelling a queued future runs its _finish here and now.
+            if superseded is not None:
+                superseded.cancel()
+        job.future.add_done_callback(lambda future: self._finish(job, future, apply))
+        return job
+
+    def _finish(self, job: Job, future: Future, apply: Callable[[Job], str]) -> None:
+        if not future.cancelled() and not job.cancelled:
+            try:
+                value = future.result()
+                if isinstance(value, SearchResult):
+                    if job.out_of_process:
+                        record_search(value)
+                        remember_minmax_move(chess.Board(job.fen), value)
+                    job.search = value
+                    value = value.move
+                job.move = value
+                job.message = apply(job)
+                job.status = DONE
+            except JobCancelled:
+                job.cancelled = True
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e)
+        if job.cancelled or future.cancelled():
+            job.status = CANCELLED
+
+        job.finished = time.monotonic()
+        with self._lock:
+            self._outstanding -= 1
+            if self._active_by_game.get(job.game_id) is job:
+                del self._active_by_game[job.game_id]
+            if job.status == DONE:
+                self._completed += 1
+            elif job.status == FAILED:
+                self._failed += 1
+            else:
+                self._cancelled += 1
+            self._latency_total += job.finished - job.created
+        job.done.set()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+        return job
+
+    # Called with the game locked whenever its position is rewound, so a late result
+    # is never pushed onto a board it wasn't computed for.
+    def cancel_game(self, game_id: str) -> None:
+        with self._lock:
+            job = self._active_by_game.get(game_id)
+            if job is None:
+                return
+            job.cancelled = True
+        job.future.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            running = sum(1 for job in self._active_by_game.values() if job.current_status() == RUNNING)
+            finished = self._completed + self._failed + self._cancelled
+            return {
+                "outstanding": self._outstanding,
+                "queue_depth": self._outstanding - running,
+                "running": running,
+                "queue_limit": self.queue_limit,
+                "completed": self._completed,
+                "failed": self._failed,
+                "cancelled": self._cancelled,
+                "rejected": self._rejected,
+                "avg_latency": self._latency_total / finished if finished else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        self._thread_pool.shutdown(wait=False, cancel_futures=True)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,274 @@
+import bisect
+import cProfile
+import heapq
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from flask import Flask, g, request
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+NODE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+DEPTH_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10)
+
+PROFILE_SLOWEST = int(os.environ.get("PYCHESS_PROFILE_SLOWEST", "0"))
+PROFILE_SAMPLE_RATE = float(os.environ.get("PYCHESS_PROFILE_SAMPLE_RATE", "0.1"))
+PROFILE_DIR = os.environ.get("PYCHESS_PROFILE_DIR", "")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_label_text(self.labels, key)} {value}" for key, value in values]
+
+
+# Read at scrape time from a callback, so nothing has to keep it up to date.
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], float]):
+        super().__init__(name, help_text)
+        self.read = read
+
+    def render(self) -> List[str]:
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        return self.header() + [f"{self.name} {value}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._series.items())
+        lines = self.header()
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_label_text(self.labels + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics = [existing for existing in self._metrics if existing.name != metric.name] + [metric]
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, read: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, help_text, read))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    # Prometheus text exposition format, version 0.0.4.
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter("pychess_http_requests_total", "HTTP requests handled.", ("route", "method", "status"))
+http_errors = registry.counter("pychess_http_request_errors_total",
+                               "HTTP requests that failed with a 5xx status or an unhandled exception.",
+                               ("route", "method"))
+http_latency = registry.histogram("pychess_http_request_duration_seconds", "HTTP request latency.", ("route", "method"))
+
+searches = registry.counter("pychess_searches_total", "Minimax bot replies by where they came from.", ("source",))
+search_nodes = registry.histogram("pychess_search_nodes", "Nodes visited per minimax search.", (), NODE_BUCKETS)
+search_depth = registry.histogram("pychess_search_depth", "Depth completed per minimax search.", (), DEPTH_BUCKETS)
+search_seconds = registry.histogram("pychess_search_duration_seconds", "Minimax search time.")
+search_nodes_total = registry.counter("pychess_search_nodes_total", "Nodes visited by minimax searches.")
+search_qnodes_total = registry.counter("pychess_search_qnodes_total", "Quiescence nodes visited by minimax searches.")
+search_tt_hits_total = registry.counter("pychess_search_tt_hits_total", "Transposition table hits in minimax searches.")
+
+engine_calls = registry.histogram("pychess_engine_call_duration_seconds", "UCI engine move time.", ("bot",))
+engine_errors = registry.counter("pychess_engine_call_errors_total", "UCI engine calls that failed.", ("bot",))
+engine_replies = registry.counter("pychess_engine_replies_total", "UCI bot replies by where they came from.",
+                                  ("bot", "source"))
+
+
+def record_search(result, source: str = "search") -> None:
+    searches.inc(source=source)
+    if source != "search":
+        return
+    search_nodes.observe(result.nodes)
+    search_depth.observe(result.depth)
+    search_seconds.observe(result.time)
+    search_nodes_total.inc(result.nodes)
+    search_qnodes_total.inc(result.qnodes)
+    search_tt_hits_total.inc(result.tt_hits)
+
+
+##############################################
+#           SLOW REQUEST PROFILER            #
+##############################################
+class SlowRequestProfile:
+    __slots__ = ("duration", "route", "method", "started", "stats")
+
+    def __init__(self, duration: float, route: str, method: str, stats: str):
+        self.duration = duration
+        self.route = route
+        self.method = method
+        self.started = time.time() - duration
+        self.stats = stats
+
+    def __lt__(self, other: "SlowRequestProfile") -> bool:
+        return self.duration < other.duration
+
+    def to_json(self) -> dict:
+        return {"duration": self.duration, "route": self.route, "method": self.method,
+                "started": self.started, "stats": self.stats}
+
+
+# Runs cProfile on a random sample of requests and keeps the slowest `keep` of them,
+# as pstats text and, when a directory is given, as .prof files for snakeviz & co.
+class SlowRequestProfiler:
+    def __init__(self, keep: int = PROFILE_SLOWEST, sample_rate: float = PROFILE_SAMPLE_RATE,
+                 directory: str = PROFILE_DIR):
+        self.keep = keep
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._slowest: List[SlowRequestProfile] = []
+
+    def start(self) -> Optional[cProfile.Profile]:
+        if random.random() >= self.sample_rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is already active in this interpreter.
+            return None
+        return profile
+
+    def finish(self, profile: cProfile.Profile, duration: float, route: str, method: str) -> None:
+        profile.disable()
+        with self._lock:
+            if len(self._slowest) >= self.keep and duration <= self._slowest[0].duration:
+                return
+        text = io.StringIO()
+        pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(30)
+        entry = SlowRequestProfile(duration, route, method, text.getvalue())
+        if self.directory:
+            name = f"{int(duration * 1000):07d}ms-{method}-{route.strip('/').replace('/', '_') or 'root'}.prof"
+            profile.dump_stats(os.path.join(self.directory, name))
+        with self._lock:
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+
+    def slowest(self) -> List[SlowRequestProfile]:
+        with self._lock:
+            return sorted(self._slowest, reverse=True)
+
+
+def instrument_app(app: Flask, profiler: Optional[SlowRequestProfiler] = None) -> None:
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_profile = profiler.start() if profiler is not None else None
+
+    @app.after_request
+    def record_request(response):
+        _finish_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def record_failure(error):
+        if error is not None and "metrics_started" in g:
+            _finish_request(500)
+
+    def _finish_request(status: int) -> None:
+        started = g.pop("metrics_started", None)
+        if started is None:
+            return
+        duration = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        http_requests.inc(route=route, method=request.method, status=status)
+        http_latency.observe(duration, route=route, method=request.method)
+        if status >= 500:
+            http_errors.inc(route=route, method=request.method)
+        profile = g.pop("metrics_profile", None)
+        if profile is not None:
+            profiler.finish(profile, duration, route, request.method)
@@ -0,0 +1,81 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import chess
+import chess.polyglot
+
+
+BOOKS_DIR = os.path.join(os.path.dirname(__file__), "books")
+DEFAULT_BOOK = "computer.bin"
+MISS_CACHE_SIZE = int(os.environ.get("PYCHESS_BOOK_MISS_CACHE_SIZE", "100000"))
+
+# One reader per book for the whole process; None records a book that is missing or unreadable.
+_readers: Dict[str, Optional[chess.polyglot.MemoryMappedReader]] = {}
+_readers_lock = threading.Lock()
+
+# (book, zobrist hash) pairs known to have no usable entry, least recently used first.
+_misses: "OrderedDict[tuple, None]" = OrderedDict()
+_misses_lock = threading.Lock()
+
+
+def book_path(name: str) -> str:
+    return name if os.path.isabs(name) else os.path.join(BOOKS_DIR, name)
+
+
+def open_book(name: str) -> Optional[chess.polyglot.MemoryMappedReader]:
+    path = book_path(name)
+    try:
+        return _readers[path]
+    except KeyError:
+        pass
+    with _readers_lock:
+        if path not in _readers:
+            try:
+                _readers[path] = chess.polyglot.MemoryMappedReader(path)
+            except (OSError, ValueError):
+                _readers[path] = None
+        return _readers[path]
+
+
+def preload_books(names: Optional[Iterable[str]] = None) -> None:
+    if names is None:
+        names = [name for name in os.environ.get("PYCHESS_PRELOAD_BOOKS", DEFAULT_BOOK).split(",") if name]
+    for name in names:
+        open_book(name.strip())
+
+
+def _remember_miss(miss: tuple) -> None:
+    with _misses_lock:
+        _misses[miss] = None
+        if len(_misses) > MISS_CACHE_SIZE:
+            _misses.popitem(last=False)
+
+
+def book_move(board: chess.Board, name: str = DEFAULT_BOOK) -> Optional[chess.Move]:
+    reader = open_book(name)
+    if reader is None:
+        return None
+
+    miss = (name, chess.polyglot.zobrist_hash(board))
+    if miss in _misses:
+        with _misses_lock:
+            if miss in _misses:
+                _misses.move_to_end(miss)
+        return None
+
+    try:
+        return reader.weighted_choice(board).move
+    except IndexError:
+        _remember_miss(miss)
+        return None
+
+
+def close_books() -> None:
+    with _readers_lock:
+        readers = list(_readers.values())
+        _readers.clear()
+    for reader in readers:
+        if reader is not None:
+            reader.close()
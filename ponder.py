@@ -0,0 +1,220 @@
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import chess
+import chess.engine
+
+from engine_pool import ENGINE_FAILURES
+from metrics import registry
+
+
+# PYCHESS_PONDER=1 gives each game playing a UCI bot an engine process of its own, which
+# keeps its hash between the game's moves and thinks on the expected reply meanwhile.
+PONDER = os.environ.get("PYCHESS_PONDER", "0").strip().lower() in ("1", "true", "yes")
+# Bound engines each take a process (and a core while pondering); games beyond this
+# fall back to the shared pools.
+PONDER_ENGINES = int(os.environ.get("PYCHESS_PONDER_ENGINES", "4"))
+# Seconds without a bot move after which a game's engine is given back.
+PONDER_IDLE = float(os.environ.get("PYCHESS_PONDER_IDLE", "300"))
+
+ponder_replies = registry.counter("pychess_ponder_replies_total",
+                                  "Bot replies from engines bound to a game, by whether the human played the predicted move.",
+                                  ("bot", "result"))
+
+
+class _Binding:
+    __slots__ = ("engine_path", "engine", "game", "lock", "last_used", "pondering")
+
+    def __init__(self, engine_path: str, engine: chess.engine.SimpleEngine):
+        self.engine_path = engine_path
+        self.engine = engine
+        # Passed as play(game=...): the engine only gets ucinewgame, and drops its hash,
+        # when this changes.
+        self.game = object()
+        # Serializes the bot moves of the game and the commands that stop its pondering.
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        # FEN the engine is pondering on: after its move and the reply it expects.
+        self.pondering: Optional[str] = None
+
+    def stop(self) -> None:
+        # Any command ends the ponder search; a ping waits for the engine to settle.
+        if self.pondering is not None:
+            self.pondering = None
+            self.engine.ping()
+
+    def close(self) -> None:
+        with self.lock:
+            self.pondering = None
+            try:
+                self.engine.quit()
+            except Exception:
+                try:
+                    self.engine.close()
+                except Exception:
+                    pass
+
+
+# One engine process per game, bound on the game's first engine bot move. After each
+# move the engine goes on searching the position after the reply it expects
+# (play(ponder=True)); when the human plays that reply, python-chess sends ponderhit on
+# the next move and the search already under way gives the answer.
+class GameEngines:
+    def __init__(self, max_engines: int = PONDER_ENGINES, idle: float = PONDER_IDLE):
+        self.max_engines = max(0, max_engines)
+        self.idle = idle
+        self._lock = threading.Lock()
+        # Least recently used first.
+        self._bindings: "OrderedDict[str, _Binding]" = OrderedDict()
+        # Engines are quit off the caller's thread: release runs under game store locks.
+        self._closer = ThreadPoolExecutor(1, thread_name_prefix="ponder-close")
+        self._spawning = 0
+        self._closed = False
+        self._stats: Dict[str, int] = {"bound": 0, "released": 0, "hits": 0, "misses": 0, "fallbacks": 0}
+
+    def _close_later(self, binding: _Binding) -> None:
+        self._stats["released"] += 1
+        try:
+            self._closer.submit(binding.close)
+        except RuntimeError:
+            binding.close()
+
+    # Caller holds self._lock. Frees idle engines, then the least recently used one if
+    # all are taken; False when every engine is busy with a move.
+    def _make_room(self, now: float) -> bool:
+        for game_id, binding in list(self._bindings.items()):
+            if now - binding.last_used > self.idle and not binding.lock.locked():
+                del self._bindings[game_id]
+                self._close_later(binding)
+        if len(self._bindings) + self._spawning < self.max_engines:
+            return True
+        for game_id, binding in self._bindings.items():
+            if not binding.lock.locked():
+                del self._bindings[game_id]
+                self._close_later(binding)
+                return True
+        return False
+
+    def _bind(self, game_id: str, engine_path: str) -> Optional[_Binding]:
+        now = time.monotonic()
+        with self._lock:
+            if self._closed:
+                return None
+            binding = self._bindings.get(game_id)
+            if binding is not None and binding.engine_path == engine_path and \
+                    not binding.engine.returncode.done():
+                binding.last_used = now
+                self._bindings.move_to_end(game_id)
+                return binding
+            if binding is not None:
+                # The game switched bots, or its engine died.
+                del self._bindings[game_id]
+                self._close_later(binding)
+            if not self._make_room(now):
+                self._stats["fallbacks"] += 1
+                return None
+            self._spawning += 1
+        try:
+            binding = _Binding(engine_path, chess.engine.SimpleEngine.popen_uci(engine_path))
+        finally:
+            with self._lock:
+                self._spawning -= 1
+        with self._lock:
+            if self._closed or game_id in self._bindings:
+                # Shut down meanwhile, or another move of the same game bound first.
+                self._close_later(binding)
+                return self._bindings.get(game_id)
+            self._bindings[game_id] = binding
+            self._stats["bound"] += 1
+        return binding
+
+    # The game's bot move, or None when no engine can be bound and the caller should use
+    # the shared pool.
+    def play(self, game_id: str, engine_path: str, board: chess.Board, limit: chess.engine.Limit,
+             bot_type: str = "") -> Optional[chess.engine.PlayResult]:
+        binding = self._bind(game_id, engine_path)
+        if binding is None:
+            return None
+        error = None
+        with binding.lock:
+            predicted = binding.pondering
+            binding.pondering = None
+            try:
+                result = binding.engine.play(board, limit, game=binding.game, ponder=True,
+                                             info=chess.engine.INFO_SCORE)
+            except ENGINE_FAILURES as e:
+                error = e
+            else:
+                if result.move is not None and result.ponder is not None:
+                    after = board.copy(stack=False)
+                    after.push(result.move)
+                    after.push(result.ponder)
+                    binding.pondering = after.fen()
+                binding.last_used = time.monotonic()
+        if error is not None:
+            self.release(game_id)
+            raise error
+        if predicted is not None:
+            hit = predicted == board.fen()
+            with self._lock:
+                self._stats["hits" if hit else "misses"] += 1
+            ponder_replies.inc(bot=bot_type, result="hit" if hit else "miss")
+        return result
+
+    # The game's position went back or elsewhere: stop thinking on a reply that no longer
+    # follows. The hash stays, and so does the engine.
+    def stop(self, game_id: str) -> None:
+        binding = self._bindings.get(game_id)
+        if binding is None:
+            return
+        try:
+            with binding.lock:
+                binding.stop()
+        except ENGINE_FAILURES:
+            self.release(game_id)
+
+    # A fresh game on the same board: the engine starts over with ucinewgame.
+    def new_game(self, game_id: str) -> None:
+        binding = self._bindings.get(game_id)
+        if binding is None:
+            return
+        self.stop(game_id)
+        binding.game = object()
+
+    # The game is gone (deleted or evicted); its engine is quit in the background.
+    def release(self, game_id: str) -> None:
+        with self._lock:
+            binding = self._bindings.pop(game_id, None)
+            if binding is not None:
+                self._close_later(binding)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["enabled"] = PONDER
+            stats["engines"] = len(self._bindings)
+            stats["max_engines"] = self.max_engines
+            stats["pondering"] = sum(1 for binding in self._bindings.values() if binding.pondering is not None)
+        answered = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / answered if answered else 0.0
+        return stats
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            bindings = list(self._bindings.values())
+            self._bindings.clear()
+        for binding in bindings:
+            binding.close()
+        self._closer.shutdown(wait=True)
+
+
+game_engines = GameEngines()
+
+# Same as the engine pools: engines run their event loops on non-daemon threads.
+getattr(threading, "_register_atexit", atexit.register)(game_engines.shutdown)
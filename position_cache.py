@@ -0,0 +1,187 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional
+
+import chess
+import chess.polyglot
+
+from sqlite_connections import ThreadConnections
+
+
+POSITION_CACHE_SIZE = int(os.environ.get("PYCHESS_POSITION_CACHE_SIZE", "50000"))
+POSITION_CACHE_TTL = float(os.environ.get("PYCHESS_POSITION_CACHE_TTL", "3600"))
+
+
+# "bot:n,bot:n" -> {bot: n}. A bot with variety n answers from the cache only once n
+# replies for the position have been collected, then picks one of them at random.
+def parse_variety(spec: str) -> Dict[str, int]:
+    variety = {}
+    for item in spec.split(","):
+        if ":" in item:
+            bot_type, count = item.split(":", 1)
+            variety[bot_type.strip()] = max(1, int(count))
+    return variety
+
+
+POSITION_CACHE_VARIETY = parse_variety(os.environ.get("PYCHESS_POSITION_CACHE_VARIETY", ""))
+
+
+class CachedReply(NamedTuple):
+    move: chess.Move
+    score: Optional[int]
+    depth: int
+
+
+class _Entry:
+    __slots__ = ("replies", "stored_at")
+
+    def __init__(self, replies: List[CachedReply], stored_at: float):
+        self.replies = replies
+        self.stored_at = stored_at
+
+
+# Best replies shared by every game in the process, keyed on the position's Zobrist
+# hash, the bot and its search limit.
+class PositionCache:
+    def __init__(self, size: int = POSITION_CACHE_SIZE, ttl: float = POSITION_CACHE_TTL,
+                 variety: Optional[Dict[str, int]] = None):
+        self.size = size
+        self.ttl = ttl
+        self.variety = POSITION_CACHE_VARIETY if variety is None else variety
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evicted = 0
+        self.expired = 0
+
+    def key(self, board: chess.Board, bot_type: str, limit: str) -> tuple:
+        return chess.polyglot.zobrist_hash(board), bot_type, limit
+
+    def _load(self, key: tuple) -> Optional[_Entry]:
+        return None
+
+    def _save(self, key: tuple, entry: _Entry) -> None:
+        pass
+
+    def get(self, board: chess.Board, bot_type: str, limit: str) -> Optional[CachedReply]:
+        key = self.key(board, bot_type, limit)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            entry = self._load(key)
+            if entry is not None:
+                with self._lock:
+                    entry = self._entries.setdefault(key, entry)
+                    self._trim()
+        if entry is not None and now - entry.stored_at > self.ttl:
+            with self._lock:
+                self._entries.pop(key, None)
+                self.expired += 1
+            entry = None
+        if entry is None or len(entry.replies) < self.variety.get(bot_type, 1):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return random.choice(entry.replies) if len(entry.replies) > 1 else entry.replies[0]
+
+    def put(self, board: chess.Board, bot_type: str, limit: str, reply: CachedReply) -> None:
+        key = self.key(board, bot_type, limit)
+        keep = self.variety.get(bot_type, 1)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry.stored_at > self.ttl:
+                entry = _Entry([], time.time())
+                self._entries[key] = entry
+            self._entries.move_to_end(key)
+            entry.replies = (entry.replies + [reply])[-keep:]
+            self.stores += 1
+            self._trim()
+        self._save(key, entry)
+
+    def _trim(self) -> None:
+        # Caller holds the lock.
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.evicted += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
+
+
+##############################################
+#           SQLITE BACKEND                   #
+##############################################
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS replies (
+    zobrist TEXT NOT NULL,
+    bot_type TEXT NOT NULL,
+    search_limit TEXT NOT NULL,
+    replies TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (zobrist, bot_type, search_limit)
+);
+"""
+
+
+# Same cache, backed by a table that every worker process can share; the in-memory
+# LRU above it still answers repeated lookups without touching the file.
+class SQLitePositionCache(PositionCache):
+    def __init__(self, path: str, size: int = POSITION_CACHE_SIZE, ttl: float = POSITION_CACHE_TTL,
+                 variety: Optional[Dict[str, int]] = None):
+        super().__init__(size, ttl, variety)
+        self.path = path
+        self._connections = ThreadConnections(path)
+        self._connections.get().executescript(SCHEMA)
+
+    def _load(self, key: tuple) -> Optional[_Entry]:
+        row = self._connections.get().execute(
+            "SELECT replies, stored_at FROM replies WHERE zobrist = ? AND bot_type = ? AND search_limit = ?",
+            (str(key[0]), key[1], key[2]),
+        ).fetchone()
+        if row is None:
+            return None
+        replies = [CachedReply(chess.Move.from_uci(move), score, depth) for move, score, depth in json.loads(row[0])]
+        return _Entry(replies, row[1])
+
+    def _save(self, key: tuple, entry: _Entry) -> None:
+        replies = json.dumps([(reply.move.uci(), reply.score, reply.depth) for reply in entry.replies])
+        with self._connections.get() as connection:
+            connection.execute("INSERT OR REPLACE INTO replies VALUES (?, ?, ?, ?, ?)",
+                               (str(key[0]), key[1], key[2], replies, entry.stored_at))
+
+    def clear(self) -> None:
+        super().clear()
+        with self._connections.get() as connection:
+            connection.execute("DELETE FROM replies")
+
+
+def open_position_cache(url: str = "") -> PositionCache:
+    url = url or os.environ.get("PYCHESS_POSITION_CACHE", "memory")
+    if url == "memory":
+        return PositionCache()
+    if url.startswith("sqlite:///"):
+        return SQLitePositionCache(url[len("sqlite:///"):])
+    raise ValueError(f"Unsupported position cache: {url}")
@@ -1,8 +1,22 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
+import io
+import json
 import traceback
 import uuid
-from game import get_board_state,make_cdrill_move,make_deuterium_move,make_minmax_move,make_stockfish_move,make_human_move,undo_last_move,reset_board
+from typing import Optional
+from game import BOT_ENGINE_PATHS,get_compact_board_state,make_cdrill_move,make_deuterium_move,make_minmax_move,make_stockfish_move,make_human_move,reset_board,bot_move_message,shutdown_search_workers,position_cache
 from game_state import GameState
+from game_store import open_game_store
+from game_pgn import game_to_pgn, read_game_states
+from engine_pool import WARM_ENGINES, pool_stats, shutdown_pools, warm_pools
+from ponder import game_engines
+from opening_book import preload_books
+from jobs import JobCancelled, JobManager, JobQueueFull
+from tablebase import tablebase_stats
+from analysis import (ANALYSIS_BOT_TYPES, ANALYSIS_BUDGET, ANALYSIS_MAX_BUDGET, ANALYSIS_MAX_TIME, ANALYSIS_TIME,
+                      AnalysisBusy, Analyzer, positions_from_fens, positions_from_pgn)
+from events import EVENT_KEEPALIVE, EventBroker, SubscribersFull, format_event
+from metrics import PROFILE_SLOWEST, SlowRequestProfiler, instrument_app, registry
 from flask_cors import CORS
 import os
 
@@ -11,29 +25,49 @@ current_dir = os.path.dirname(__file__)
 
 app = Flask(__name__)
 CORS(app) 
+preload_books()
+if WARM_ENGINES:
+    warm_pools(BOT_ENGINE_PATHS.values())
+
+# PYCHESS_PROFILE_SLOWEST=N profiles a sample of requests and keeps the N slowest.
+profiler = SlowRequestProfiler() if PROFILE_SLOWEST > 0 else None
+instrument_app(app, profiler)
 
 
 
 ##############################################
 #           GAME MANAGEMENT                  #
 ##############################################
-game_states = {}
+# PYCHESS_GAME_STORE selects the backend: "memory" (default) or "sqlite:///path/to/games.db".
+game_store = open_game_store()
+# An evicted game no longer needs the engine bound to it.
+game_store.evict_listeners.append(game_engines.release)
 
 
 def create_game( is_vs_bot=False, player1=None, player2=None) -> GameState:
     game_id  = str(uuid.uuid4())
     game_state = GameState(game_id=game_id, is_vs_bot=is_vs_bot, player1=player1, player2=player2)
-    game_states[game_id] = game_state
+    game_store.add(game_state)
     return game_state
 
 
 def get_game(game_id:str) -> GameState:
-    return game_states.get(game_id)
+    return game_store.get(game_id)
+
+
+def locked_game(game_id: str):
+    return game_store.locked(game_id)
+
+
+def save_game(game_state: GameState) -> None:
+    game_store.save(game_state)
 
 
 def delete_game(game_id):
-    if game_id in game_states:
-        del game_states[game_id]
+    job_manager.cancel_game(game_id)
+    game_engines.release(game_id)
+    game_store.delete(game_id)
+    event_broker.close_game(game_id)
 
 
 
@@ -46,6 +80,92 @@ def api_response(text: str, **kwargs) -> dict:
     return response
 
 
+# Version of the game the client already holds, if it only wants what changed since.
+def requested_version(data):
+    try:
+        return int(data["since"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+# Clients that render the board themselves can ask for board_format=fen or array.
+def board_state_for(board, data):
+    return get_compact_board_state(board, (data.get("board_format") or "").strip().lower())
+
+
+def is_async_request(data) -> bool:
+    return data.get("async", "").strip().lower() in ("1", "true", "yes")
+
+
+##############################################
+#           GAME EVENTS                      #
+##############################################
+event_broker = EventBroker()
+
+
+def game_event_data(game_state: GameState, since=None) -> dict:
+    return {"game_json": game_state.get_json(since), "board_state": get_compact_board_state(game_state.board)}
+
+
+# Called with the game locked, right after a change; since is the version seen before it,
+# as one change can bump the version more than once (a suggestion spends credit and moves).
+def publish_game(game_state: GameState, event_type: str, since: int) -> None:
+    if not event_broker.has_subscribers(game_state.game_id):
+        return
+    data = game_event_data(game_state, since)
+    event_broker.publish(game_state.game_id, event_type, data, game_state.version)
+    if event_type == "move" and game_state.has_game_over:
+        event_broker.publish(game_state.game_id, "game_over", {"message": game_state.get_game_status_message(),
+                                                               "result": game_state.result}, game_state.version)
+
+
+##############################################
+#           ASYNC BOT JOBS                   #
+##############################################
+job_manager = JobManager()
+
+SUGGESTION_BOTS = {
+    "beginner": "minmax",
+    "intermediate": "deuterium",
+    "advanced": "cdrill",
+    "superhuman": "stockfish",
+}
+
+
+def apply_bot_job(job) -> str:
+    with locked_game(job.game_id) as game_state:
+        if not game_state or job.cancelled or game_state.board.fen() != job.fen:
+            raise JobCancelled()
+        since = game_state.version
+        game_state.board.push(job.move)
+        result = bot_move_message(job.bot_type, job.move, job.search)
+        game_state.add_move(result)
+        save_game(game_state)
+        publish_game(game_state, "move", since)
+        return result
+
+
+def apply_suggestion_job(job) -> str:
+    with locked_game(job.game_id) as game_state:
+        if not game_state or job.cancelled or game_state.board.fen() != job.fen:
+            raise JobCancelled()
+        since = game_state.version
+        game_state.board.push(job.move)
+        game_state.update_credit()
+        game_state.add_move(job.move)
+        save_game(game_state)
+        publish_game(game_state, "move", since)
+        return bot_move_message(job.bot_type, job.move, job.search)
+
+
+def submit_job(game_state: GameState, bot_type: str, apply, bound: bool = False):
+    try:
+        job = job_manager.submit(game_state.game_id, bot_type, game_state.board, apply, bound)
+    except JobQueueFull:
+        return jsonify(api_response("Too many bot moves queued. Please try again later.")), 503
+    return jsonify(api_response("Bot move queued.", job=job.to_json())), 202
+
+
 ##############################################
 #           API ROUTES                       #
 ##############################################
@@ -71,15 +191,19 @@ def human_move():
         if not game_id or not move:
             return jsonify(api_response("Game ID and move parameters are required.")), 400
 
-        game_state = get_game(game_id)
-        if not game_state or not game_state.game_started:
-            return jsonify(api_response("Game not found or not started.")), 400
-        
-
-        result = make_human_move(game_state.board, move)
-        game_state.add_move(move)
-        board_state = get_board_state(game_state.board)
-        game_json = game_state.get_json()
+        with locked_game(game_id) as game_state:
+            if not game_state or not game_state.game_started:
+                return jsonify(api_response("Game not found or not started.")), 400
+
+            since = game_state.version
+            result = make_human_move(game_state.board, move)
+            # A bot move queued for the previous position would only be thrown away.
+            job_manager.cancel_game(game_id)
+            game_state.add_move(move)
+            save_game(game_state)
+            publish_game(game_state, "move", since)
+            board_state = board_state_for(game_state.board, body)
+            game_json = game_state.get_json(requested_version(body))
         
         
         return jsonify(api_response(result, board_state=board_state,game_json=game_json))
@@ -103,51 +227,206 @@ def bot_move():
         if not game_id or bot_type not in ["stockfish", "deuterium", "cdrill", "minmax"]:
             return jsonify(api_response("Invalid game ID or bot type.")), 400
 
-        game_state = get_game(game_id)
-        if not game_state or not game_state.game_started:
-            return jsonify(api_response("Game not found or not started.")), 400
-
-        if bot_type == "stockfish":
-            result = make_stockfish_move(game_state.board)
-        elif bot_type == "deuterium":
-            result = make_deuterium_move(game_state.board)
-        elif bot_type == "cdrill":
-            result = make_cdrill_move(game_state.board)
-        else:
-            result = make_minmax_move(game_state.board)
-
-        game_state.add_move(result) 
-        board_state = get_board_state(game_state.board)
-        game_json = game_state.get_json()
+        with locked_game(game_id) as game_state:
+            if not game_state or not game_state.game_started:
+                return jsonify(api_response("Game not found or not started.")), 400
+
+            if is_async_request(data):
+                return submit_job(game_state, bot_type, apply_bot_job, bound=True)
+
+            job_manager.cancel_game(game_id)
+            since = game_state.version
+            if bot_type == "stockfish":
+                result = make_stockfish_move(game_state.board, game_id)
+            elif bot_type == "deuterium":
+                result = make_deuterium_move(game_state.board, game_id)
+            elif bot_type == "cdrill":
+                result = make_cdrill_move(game_state.board, game_id)
+            else:
+                result = make_minmax_move(game_state.board)
+
+            game_state.add_move(result) 
+            save_game(game_state)
+            publish_game(game_state, "move", since)
+            board_state = board_state_for(game_state.board, data)
+            game_json = game_state.get_json(requested_version(data))
         return jsonify(api_response(result, board_state=board_state,game_json=game_json))
     except Exception:
         traceback.print_exc()
         return jsonify(api_response("Error while making the bot's move. Please try again.")), 400
 
 
+@app.route("/bot-move-result", methods=["GET"])
+def bot_move_result():
+    data = request.args
+    job_id = data.get("job_id", "").strip()
+    try:
+        wait = min(max(float(data.get("wait", 0)), 0.0), 30.0)
+    except ValueError:
+        return jsonify(api_response("Invalid wait parameter.")), 400
+
+    job = job_manager.wait(job_id, wait) if job_id else None
+    if not job:
+        return jsonify(api_response("Job not found.")), 404
+
+    job_json = job.to_json()
+    if not job.done.is_set():
+        return jsonify(api_response(f"Bot move {job_json['status']}.", job=job_json)), 202
+
+    with locked_game(job.game_id) as game_state:
+        if not game_state:
+            return jsonify(api_response("Game not found.", job=job_json)), 404
+        board_state = board_state_for(game_state.board, data)
+        game_json = game_state.get_json(requested_version(data))
+    return jsonify(api_response(job.message or f"Bot move {job_json['status']}.", job=job_json,
+                                board_state=board_state, game_json=game_json))
+
+
+@app.route("/game-state")
+def game_state_route():
+    data = request.args
+    game_id = data.get("game_id", "").strip()
+    with locked_game(game_id) as game_state:
+        if not game_state:
+            return jsonify(api_response("Game not found.")), 404
+        board_state = board_state_for(game_state.board, data)
+        game_json = game_state.get_json(requested_version(data))
+    return jsonify(api_response(game_state.get_game_status_message(), board_state=board_state, game_json=game_json))
+
+
+# Server-sent events for one game: a "state" event first (everything since the version in
+# "since" or Last-Event-ID, else the whole game), then "move", "undo", "redo", "jump", "reset" and
+# "game_over" events as they happen, each carrying the changes since the previous version.
+# An open stream holds its worker until the client leaves: serve the app with gevent workers
+# (gunicorn -k gevent), where the wait yields to other requests, or give a threaded server
+# more threads than PYCHESS_EVENT_MAX_SUBSCRIBERS so moves are still answered while the
+# streams are full. Beyond that cap new streams get a 503.
+@app.route("/game-events")
+def game_events():
+    data = request.args
+    game_id = data.get("game_id", "").strip()
+    since = requested_version(data)
+    if since is None:
+        since = requested_version({"since": request.headers.get("Last-Event-ID")})
+
+    with locked_game(game_id) as game_state:
+        if not game_state:
+            return jsonify(api_response("Game not found.")), 404
+        # Subscribing under the game lock means no change falls between the snapshot and the stream.
+        try:
+            subscriber = event_broker.subscribe(game_id)
+        except SubscribersFull:
+            return jsonify(api_response("Too many open event streams. Please try again later.")), 503
+        snapshot = format_event("state", game_event_data(game_state, since), game_state.version)
+
+    def stream():
+        try:
+            yield snapshot
+            while not subscriber.closed:
+                events, lagged = subscriber.next_events(EVENT_KEEPALIVE)
+                if lagged:
+                    with locked_game(game_id) as game_state:
+                        if not game_state:
+                            return
+                        events = [format_event("state", game_event_data(game_state), game_state.version)]
+                if not events:
+                    events = [": keepalive\n\n"]
+                yield "".join(events)
+        finally:
+            event_broker.unsubscribe(subscriber)
+
+    response = Response(stream(), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Frees the slot even when the client goes away before the stream starts.
+    response.call_on_close(lambda: event_broker.unsubscribe(subscriber))
+    return response
+
+
+@app.route("/event-stats")
+def event_stats():
+    return jsonify(api_response("Game event statistics.", events=event_broker.stats()))
+
+
+@app.route("/job-stats")
+def job_stats():
+    return jsonify(api_response("Bot job statistics.", jobs=job_manager.stats()))
+
+
 ##############################################
 #           GAME MANAGEMENT ROUTES           #
 ##############################################
 
-@app.route("/undo-move", methods=["POST"])
-def undo_move():
-    try:
-        game_id = request.json.get("game_id", "").strip()
-        game_state = get_game(game_id)
+# How many plies a time travel request asks for: "count" in the body, 1 by default.
+def requested_count(body) -> int:
+    count = int(body.get("count", 1))
+    if count < 1:
+        raise ValueError("count must be at least 1.")
+    return count
 
-        if not game_state or not game_state.game_started:
-            return jsonify(api_response("Game not found or not started.")), 400
 
-        result = undo_last_move(game_state.board)
-        game_state.move_history.pop() 
-        board_state = get_board_state(game_state.board)
-        game_json = game_state.get_json()
-        return jsonify(api_response(result, board_state=board_state,game_json=game_json))
-    except IndexError:
-        return jsonify(api_response("No moves to undo.")), 400
+# Undo, redo and jump share the locking, job cancelling and publishing; travel gets the
+# game and returns the message, or None when there was nothing to do.
+def travel_route(event_type: str, travel, nothing_message: str):
+    body = request.json or {}
+    game_id = body.get("game_id", "").strip()
+    try:
+        with locked_game(game_id) as game_state:
+            if not game_state or not game_state.game_started:
+                return jsonify(api_response("Game not found or not started.")), 400
+
+            job_manager.cancel_game(game_id)
+            game_engines.stop(game_id)
+            since = game_state.version
+            result = travel(game_state, body)
+            if result is None:
+                return jsonify(api_response(nothing_message)), 400
+            save_game(game_state)
+            publish_game(game_state, event_type, since)
+            board_state = board_state_for(game_state.board, body)
+            game_json = game_state.get_json(requested_version(body))
+        return jsonify(api_response(result, board_state=board_state, game_json=game_json))
+    except (TypeError, ValueError) as e:
+        return jsonify(api_response(str(e))), 400
     except Exception:
         traceback.print_exc()
-        return jsonify(api_response("Nothing to undo.")), 400
+        return jsonify(api_response(nothing_message)), 400
+
+
+def undo_travel(game_state: GameState, body) -> Optional[str]:
+    undone = game_state.undo_moves(requested_count(body))
+    if not undone:
+        return None
+    return "Last move undone." if undone == 1 else f"{undone} moves undone."
+
+
+def redo_travel(game_state: GameState, body) -> Optional[str]:
+    redone = game_state.redo_moves(requested_count(body))
+    if not redone:
+        return None
+    return "Move redone." if redone == 1 else f"{redone} moves redone."
+
+
+def jump_travel(game_state: GameState, body) -> str:
+    if "ply" not in body:
+        raise ValueError("ply is required.")
+    ply = game_state.jump_to_ply(int(body["ply"]))
+    return f"Jumped to ply {ply}."
+
+
+@app.route("/undo-move", methods=["POST"])
+def undo_move():
+    return travel_route("undo", undo_travel, "No moves to undo.")
+
+
+@app.route("/redo-move", methods=["POST"])
+def redo_move():
+    return travel_route("redo", redo_travel, "No moves to redo.")
+
+
+# Jumps to the position after "ply" moves, anywhere from the start to the end of the redo line.
+@app.route("/jump-to-ply", methods=["POST"])
+def jump_to_ply():
+    return travel_route("jump", jump_travel, "Could not jump to that ply.")
 
 
 @app.route("/start-game", methods=["POST"])
@@ -162,7 +441,8 @@ def start_game():
         game_state = create_game(is_vs_bot=is_vs_bot, player1=player1, player2=player2)
         game_state.start_game()
         reset_board(game_state.board)
-        board_state = get_board_state(game_state.board)
+        save_game(game_state)
+        board_state = board_state_for(game_state.board, data)
         game_json = game_state.get_json()
 
         return jsonify(api_response("Game started. Best of luck!",board_state=board_state,game_json=game_json))
@@ -176,23 +456,79 @@ def start_game():
 @app.route("/reset-board", methods=["POST"])
 def reset_board_route():
     try:
-        game_id = request.json.get("game_id", "").strip()
-        game_state = get_game(game_id)
-
-        if not game_state:
-            return jsonify(api_response("Game not found.")), 400
-
-        reset_board(game_state.board)
-        board_state = get_board_state(game_state.board)
-        game_json = game_state.get_json()
+        body = request.json
+        game_id = body.get("game_id", "").strip()
+        with locked_game(game_id) as game_state:
+            if not game_state:
+                return jsonify(api_response("Game not found.")), 400
+
+            job_manager.cancel_game(game_id)
+            game_engines.new_game(game_id)
+            since = game_state.version
+            game_state.reset()
+            save_game(game_state)
+            publish_game(game_state, "reset", since)
+            board_state = board_state_for(game_state.board, body)
+            game_json = game_state.get_json(requested_version(body))
         return jsonify(api_response(f"Game {game_id} board reset successfully.", board_state=board_state,game_json=game_json))
     except Exception:
         traceback.print_exc()
         return jsonify(api_response("Failed to reset the board. Please try again.")), 500
 
 
-
-
+##############################################
+#           PGN ROUTES                       #
+##############################################
+IMPORT_ID_LIMIT = int(os.environ.get("PYCHESS_IMPORT_ID_LIMIT", "1000"))
+IMPORT_ERROR_LIMIT = 100
+
+
+# One game by game_id, or every finished game streamed one at a time.
+@app.route("/export-pgn")
+def export_pgn():
+    game_id = request.args.get("game_id", "").strip()
+    if game_id:
+        with locked_game(game_id) as game_state:
+            if not game_state:
+                return jsonify(api_response("Game not found.")), 404
+            pgn = game_to_pgn(game_state)
+        return Response(pgn, mimetype="application/x-chess-pgn",
+                        headers={"Content-Disposition": f'attachment; filename="{game_id}.pgn"'})
+
+    def stream():
+        for record in game_store.iter_records():
+            game_state = GameState.from_record(record)
+            if game_state.has_game_over:
+                yield game_to_pgn(game_state)
+
+    return Response(stream(), mimetype="application/x-chess-pgn",
+                    headers={"Content-Disposition": 'attachment; filename="games.pgn"'})
+
+
+# Takes a PGN file (raw body or a "pgn" form upload) and adds each game as a new game,
+# keeping the ids from GameId headers with keep_ids=1. The body is read one game at a time.
+@app.route("/import-pgn", methods=["POST"])
+def import_pgn():
+    upload = request.files.get("pgn")
+    raw = upload.stream if upload is not None else request.stream
+    keep_ids = request.args.get("keep_ids", "").strip().lower() in ("1", "true", "yes")
+    imported = 0
+    game_ids = []
+    errors = []
+    failed = 0
+    for game_state, error in read_game_states(io.TextIOWrapper(raw, encoding="utf-8", errors="replace"), keep_ids):
+        if error is not None:
+            failed += 1
+            if len(errors) < IMPORT_ERROR_LIMIT:
+                errors.append({"game": imported + failed - 1, "error": error})
+            continue
+        game_store.add(game_state)
+        imported += 1
+        if len(game_ids) < IMPORT_ID_LIMIT:
+            game_ids.append(game_state.game_id)
+    status = 200 if imported or not failed else 400
+    return jsonify(api_response(f"Imported {imported} games, {failed} failed.", imported=imported, failed=failed,
+                                game_ids=game_ids, errors=errors)), status
 
 
 # Summary Table of Chess Engine Strength
@@ -218,33 +554,41 @@ def suggest_move():
         if bot_strength not in valid_strengths:
             return jsonify(api_response(f"Invalid bot strength. Must be one of: {[strength for strength in valid_strengths]}")), 400
 
-        game_state = get_game(game_id)
-        if not game_state:
-            return jsonify(api_response("Game not found.")), 404
-        if not game_state.game_started:
-            return jsonify(api_response("Game not started yet.")), 400
-        
-        credit_left = game_state.suggestion_credit
-        if credit_left <= 0:
-            return jsonify(api_response("No credit left to suggest a move.")), 400
-
-        board = game_state.board
-        
-        if bot_strength == "beginner":
-            move = make_minmax_move(board)
-        elif bot_strength == "intermediate":
-            move = make_deuterium_move(board)
-        elif bot_strength == "advanced":
-            move = make_cdrill_move(board)
-        elif bot_strength == "superhuman":
-            move = make_stockfish_move(board)
-        else:
-            return jsonify(api_response("Unhandled bot strength error.")), 500
-
-        if not move:
-            return jsonify(api_response("No valid move could be generated.")), 500
-        
-        game_state.update_credit()
+        with locked_game(game_id) as game_state:
+            if not game_state:
+                return jsonify(api_response("Game not found.")), 404
+            if not game_state.game_started:
+                return jsonify(api_response("Game not started yet.")), 400
+
+            credit_left = game_state.suggestion_credit
+            if credit_left <= 0:
+                return jsonify(api_response("No credit left to suggest a move.")), 400
+
+            if is_async_request(data):
+                return submit_job(game_state, SUGGESTION_BOTS[bot_strength], apply_suggestion_job)
+
+            job_manager.cancel_game(game_id)
+            since = game_state.version
+            board = game_state.board
+
+            if bot_strength == "beginner":
+                move = make_minmax_move(board)
+            elif bot_strength == "intermediate":
+                move = make_deuterium_move(board)
+            elif bot_strength == "advanced":
+                move = make_cdrill_move(board)
+            elif bot_strength == "superhuman":
+                move = make_stockfish_move(board)
+            else:
+                return jsonify(api_response("Unhandled bot strength error.")), 500
+
+            if not move:
+                return jsonify(api_response("No valid move could be generated.")), 500
+
+            game_state.update_credit()
+            game_state.add_move()
+            save_game(game_state)
+            publish_game(game_state, "move", since)
         return jsonify(api_response(move))
 
     except Exception as e:
@@ -254,6 +598,94 @@ def suggest_move():
 
 
 
+##############################################
+#           ANALYSIS ROUTES                  #
+##############################################
+analyzer = Analyzer()
+
+
+def bounded_float(value, default: float, maximum: float) -> float:
+    if value is None or value == "":
+        return default
+    return min(max(float(value), 0.01), maximum)
+
+
+# Offline analysis of many positions, from "fens" or the main lines of a "pgn". Results
+# stream back as one JSON object per line as they finish, then a summary line. Nothing
+# here reads or changes a live game, and no suggestion credit is spent.
+@app.route("/analyse", methods=["POST"])
+def analyse():
+    body = request.get_json(silent=True) or {}
+    bot_type = str(body.get("bot_type", "minmax")).strip().lower()
+    if bot_type not in ANALYSIS_BOT_TYPES:
+        return jsonify(api_response(f"Invalid bot type. Must be one of: {list(ANALYSIS_BOT_TYPES)}")), 400
+    try:
+        think_time = bounded_float(body.get("time"), ANALYSIS_TIME, ANALYSIS_MAX_TIME)
+        budget = bounded_float(body.get("budget"), ANALYSIS_BUDGET, ANALYSIS_MAX_BUDGET)
+        if body.get("pgn"):
+            positions = positions_from_pgn(str(body["pgn"]))
+        elif isinstance(body.get("fens"), list) and body["fens"]:
+            positions = positions_from_fens([str(fen) for fen in body["fens"]])
+        else:
+            return jsonify(api_response("Either fens (a list of FENs) or pgn is required.")), 400
+    except ValueError as e:
+        return jsonify(api_response(f"Invalid analysis request: {e}")), 400
+
+    try:
+        analyzer.acquire()
+    except AnalysisBusy:
+        return jsonify(api_response("Too many analysis batches running. Please try again later.")), 503
+
+    def stream():
+        for line in analyzer.run(positions, bot_type, think_time, budget):
+            yield json.dumps(line, separators=(",", ":")) + "\n"
+
+    response = Response(stream(), mimetype="application/x-ndjson",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # Runs even when the client goes away before the stream starts.
+    response.call_on_close(analyzer.release)
+    return response
+
+
+@app.route("/analysis-stats")
+def analysis_stats():
+    return jsonify(api_response("Analysis statistics.", analysis=analyzer.stats()))
+
+
+@app.route("/position-cache-stats")
+def position_cache_stats():
+    return jsonify(api_response("Position cache statistics.", cache=position_cache.stats()))
+
+
+registry.gauge("pychess_live_games", "Games held in memory.", game_store.live_games)
+registry.gauge("pychess_bot_jobs_outstanding", "Bot moves queued or running.", lambda: job_manager.stats()["outstanding"])
+registry.gauge("pychess_event_subscribers", "Open game event streams.", lambda: event_broker.stats()["subscribers"])
+registry.gauge("pychess_bound_engines", "Engine processes bound to a game.", lambda: game_engines.stats()["engines"])
+registry.gauge("pychess_position_cache_entries", "Positions in the reply cache.", lambda: position_cache.stats()["entries"])
+
+
+@app.route("/metrics")
+def metrics_route():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/slow-requests")
+def slow_requests():
+    if profiler is None:
+        return jsonify(api_response("Profiling is off; set PYCHESS_PROFILE_SLOWEST to enable it.")), 404
+    return jsonify(api_response("Slowest profiled requests.", requests=[entry.to_json() for entry in profiler.slowest()]))
+
+
+@app.route("/tablebase-stats")
+def tablebase_stats_route():
+    return jsonify(api_response("Syzygy tablebase statistics.", tablebase=tablebase_stats()))
+
+
+@app.route("/engine-stats")
+def engine_stats():
+    return jsonify(api_response("Engine pool statistics.", pools=pool_stats(), ponder=game_engines.stats()))
+
+
 @app.route('/<path:invalid_route>', methods=["GET", "POST"])
 def handle_invalid_route(invalid_route):
     method = request.method
@@ -263,7 +695,15 @@ def handle_invalid_route(invalid_route):
     )), 404
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    try:
+        app.run(debug=True)
+    finally:
+        job_manager.shutdown()
+        analyzer.shutdown()
+        shutdown_search_workers()
+        game_engines.shutdown()
+        shutdown_pools()
+        game_store.close()
 
 
 
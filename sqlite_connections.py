@@ -0,0 +1,21 @@
+import sqlite3
+import threading
+
+
+# One WAL-mode connection per thread for a SQLite file, as the SQLite game store and
+# position cache use it: readers never wait on a writer, and several worker processes
+# can share the file.
+class ThreadConnections:
+    def __init__(self, path: str, timeout: float = 30):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.timeout)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
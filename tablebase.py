@@ -0,0 +1,144 @@
+import os
+import threading
+from typing import Optional, Tuple
+
+import chess
+import chess.syzygy
+
+from metrics import registry
+
+
+# Directories holding Syzygy .rtbw/.rtbz files, separated like PATH. Unset means no probing.
+SYZYGY_DIR = os.environ.get("PYCHESS_SYZYGY_DIR", "")
+SYZYGY_MAX_FDS = int(os.environ.get("PYCHESS_SYZYGY_MAX_FDS", "128"))
+
+# Below MATE_SCORE, so a tablebase win never stops iterative deepening the way a mate does.
+TABLEBASE_WIN_SCORE = 9000
+
+tablebase_probes = registry.counter("pychess_tablebase_probes_total", "Syzygy tablebase probes by outcome.",
+                                    ("kind", "result"))
+
+# One Tablebase for the whole process; it opens each table file on first use and keeps
+# it mapped. None until opened, False once known to be unavailable.
+_tablebase = None
+_lock = threading.Lock()
+# Largest piece count the loaded tables cover; 0 disables probing, and is what the
+# search checks before paying for a probe.
+max_pieces = 0
+
+_stats = {"wdl_probes": 0, "wdl_hits": 0, "root_probes": 0, "root_hits": 0}
+
+
+def open_tablebase(directory: Optional[str] = None) -> Optional[chess.syzygy.Tablebase]:
+    global _tablebase, max_pieces
+    if _tablebase is not None and directory is None:
+        return _tablebase or None
+    with _lock:
+        if _tablebase is not None and directory is None:
+            return _tablebase or None
+        directories = [path for path in (SYZYGY_DIR if directory is None else directory).split(os.pathsep) if path]
+        tablebase = chess.syzygy.Tablebase(max_fds=SYZYGY_MAX_FDS)
+        found = 0
+        for path in directories:
+            try:
+                found += tablebase.add_directory(path)
+            except OSError:
+                pass
+        if _tablebase:
+            _tablebase.close()
+        if not found:
+            tablebase.close()
+            _tablebase, max_pieces = False, 0
+            return None
+        # Table names list the pieces, e.g. KRPvKR.
+        _tablebase = tablebase
+        max_pieces = max(len(name) - 1 for name in tablebase.wdl)
+        return tablebase
+
+
+def close_tablebase() -> None:
+    global _tablebase, max_pieces
+    with _lock:
+        if _tablebase:
+            _tablebase.close()
+        _tablebase, max_pieces = None, 0
+
+
+def covers(board: chess.Board) -> bool:
+    if _tablebase is None:
+        open_tablebase()
+    return not board.castling_rights and board.occupied.bit_count() <= max_pieces
+
+
+def wdl_score(wdl: int) -> int:
+    # Cursed wins and blessed losses are draws under the fifty-move rule.
+    if wdl == 2:
+        return TABLEBASE_WIN_SCORE
+    if wdl == -2:
+        return -TABLEBASE_WIN_SCORE
+    return 0
+
+
+# Score of the position for the side to move, or None when no loaded table covers it.
+def probe_score(board: chess.Board) -> Optional[int]:
+    tablebase = open_tablebase()
+    if tablebase is None or not covers(board):
+        return None
+    _stats["wdl_probes"] += 1
+    try:
+        wdl = tablebase.probe_wdl(board)
+    except KeyError:
+        tablebase_probes.inc(kind="wdl", result="miss")
+        return None
+    _stats["wdl_hits"] += 1
+    tablebase_probes.inc(kind="wdl", result="hit")
+    return wdl_score(wdl)
+
+
+# The move that keeps the best result and makes progress towards it (DTZ), with its
+# score; None if the position or any reply falls outside the loaded tables.
+def tablebase_move(board: chess.Board) -> Optional[Tuple[chess.Move, int]]:
+    tablebase = open_tablebase()
+    if tablebase is None or not covers(board):
+        return None
+    _stats["root_probes"] += 1
+    best = None
+    best_key = None
+    board = board.copy(stack=False)
+    try:
+        for move in board.legal_moves:
+            zeroing = board.is_zeroing(move)
+            board.push(move)
+            try:
+                if board.is_checkmate():
+                    best, best_key = (move, 2), (2, True, float("inf"))
+                    break
+                wdl = -tablebase.probe_wdl(board)
+                dtz = tablebase.probe_dtz(board)
+            finally:
+                board.pop()
+            # Win by resetting the fifty-move count or in the fewest plies until it is reset,
+            # lose in the most; dtz is the opponent's.
+            if wdl > 0:
+                key = (wdl, zeroing, -abs(dtz))
+            else:
+                key = (wdl, False, abs(dtz) if wdl < 0 else 0)
+            if best_key is None or key > best_key:
+                best, best_key = (move, wdl), key
+    except KeyError:
+        tablebase_probes.inc(kind="root", result="miss")
+        return None
+    if best is None:
+        return None
+    _stats["root_hits"] += 1
+    tablebase_probes.inc(kind="root", result="hit")
+    return best[0], wdl_score(best[1])
+
+
+def tablebase_stats() -> dict:
+    open_tablebase()
+    stats = dict(_stats)
+    stats["max_pieces"] = max_pieces
+    stats["tables"] = len({id(table) for table in _tablebase.wdl.values()}) if _tablebase else 0
+    stats["wdl_hit_rate"] = stats["wdl_hits"] / stats["wdl_probes"] if stats["wdl_probes"] else 0.0
+    return stats
@@ -0,0 +1,56 @@
+import os
+import sys
+import threading
+
+import chess
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jobs
+from jobs import CANCELLED, DONE, JobManager
+
+
+@pytest.fixture
+def blocking_engine(monkeypatch):
+    release = threading.Event()
+
+    def play_engine_move(engine_path, board, game_id=None):
+        release.wait(5)
+        return next(iter(board.legal_moves))
+
+    monkeypatch.setattr(jobs, "play_engine_move", play_engine_move)
+    yield release
+    release.set()
+
+
+def apply_move(job) -> str:
+    return job.move.uci()
+
+
+# A job superseded while still queued is cancelled, and cancelling it runs its _finish
+# on the submitting thread; that must not deadlock on the manager's lock.
+def test_supersede_queued_job(blocking_engine):
+    manager = JobManager(engine_threads=1)
+    try:
+        board = chess.Board()
+        running = manager.submit("g1", "stockfish", board, apply_move)
+        queued = manager.submit("g2", "stockfish", board, apply_move)
+        board.push_uci("e2e4")
+
+        submitted = []
+        thread = threading.Thread(target=lambda: submitted.append(manager.submit("g2", "stockfish", board, apply_move)),
+                                  daemon=True)
+        thread.start()
+        thread.join(2)
+        assert not thread.is_alive(), "submit deadlocked superseding a queued job"
+
+        assert queued.done.is_set()
+        assert queued.status == CANCELLED
+        blocking_engine.set()
+        assert manager.wait(submitted[0].job_id, 5).status == DONE
+        assert manager.wait(running.job_id, 5).status == DONE
+        assert manager.stats()["outstanding"] == 0
+    finally:
+        blocking_engine.set()
+        manager.shutdown()
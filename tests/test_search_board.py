@@ -0,0 +1,60 @@
+import os
+import sys
+
+import chess
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game import SearchBoard, evaluate_board
+
+
+# Every move from these positions and every reply to it is checked, so between them they
+# cover each kind of move the incremental score has to get right.
+CORPUS = [
+    # Castling on both wings, for either side to move.
+    ("r3k2r/pppq1ppp/2npbn2/4p3/4P3/2NPBN2/PPPQ1PPP/R3K2R w KQkq - 0 1", False),
+    ("r3k2r/pppq1ppp/2npbn2/4p3/4P3/2NPBN2/PPPQ1PPP/R3K2R b KQkq - 0 1", False),
+    # Chess960 castling, where the king moves onto or past its rook.
+    ("1r2k1r1/pppppppp/8/8/8/8/PPPPPPPP/1R2K1R1 w GBgb - 0 1", True),
+    ("rk4r1/pppppppp/8/8/8/8/PPPPPPPP/RK4R1 w GAga - 0 1", True),
+    # En passant for white and for black.
+    ("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3", False),
+    ("rnbqkbnr/pppp1ppp/8/8/3Pp3/8/PPP1PPPP/RNBQKBNR b KQkq d3 0 3", False),
+    # A double push in reply that can be taken en passant.
+    ("4k3/8/8/8/1p1p4/8/2P5/4K3 w - - 0 1", False),
+    # Promotion to every piece, pushed and capturing onto the last rank, for both sides.
+    ("1n2k1r1/P1P4P/8/8/8/8/p1p4p/1N2K1R1 w - - 0 1", False),
+    ("1n2k1r1/P1P4P/8/8/8/8/p1p4p/1N2K1R1 b - - 0 1", False),
+    # Mate in one, stalemate and a capture that leaves bare kings.
+    ("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1", False),
+    ("7k/8/5QK1/8/8/8/8/8 w - - 0 1", False),
+    ("8/8/8/4k3/8/2n5/3K4/8 w - - 0 1", False),
+    # A middlegame with captures of every piece type.
+    ("r1bq1rk1/pp2bppp/2n1pn2/2pp4/2PP4/2NBPN2/PP3PPP/R1BQ1RK1 w - - 0 8", False),
+]
+
+
+def expected(board: chess.Board) -> int:
+    return evaluate_board(chess.Board(board.fen(), chess960=board.chess960))
+
+
+@pytest.mark.parametrize("fen, chess960", CORPUS)
+def test_incremental_score_matches_evaluate_board(fen, chess960):
+    board = SearchBoard(fen, chess960=chess960)
+    root = expected(board)
+    assert board.evaluate() == root
+
+    for move in list(board.legal_moves):
+        board.push(move)
+        assert board.evaluate() == expected(board), f"{fen}: {move.uci()}"
+        for reply in list(board.legal_moves):
+            board.push(reply)
+            assert board.evaluate() == expected(board), f"{fen}: {move.uci()} {reply.uci()}"
+            board.pop()
+        assert board.evaluate() == expected(board), f"{fen}: back to {move.uci()}"
+        board.pop()
+
+    assert board.fen() == chess.Board(fen, chess960=chess960).fen()
+    assert len(board.eval_stack) == 1
+    assert board.evaluate() == root
@@ -0,0 +1,310 @@
+import argparse
+import csv
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import chess
+import chess.engine
+import chess.pgn
+import chess.polyglot
+
+from engine_pool import get_pool
+from game import BOT_ENGINE_PATHS, BOT_NAMES, minmax_move
+from opening_book import DEFAULT_BOOK, book_path, open_book
+
+
+TOURNAMENT_BOT_TYPES = ("minmax",) + tuple(BOT_ENGINE_PATHS)
+
+# One row per finished game; the file doubles as the checkpoint a resumed run reads back.
+CSV_FIELDS = ("index", "white", "black", "result", "termination", "plies", "opening",
+              "white_time", "white_moves", "black_time", "black_moves", "seconds")
+
+# 95% confidence interval.
+Z_95 = 1.959964
+
+
+class Task(NamedTuple):
+    index: int
+    white: str
+    black: str
+    # Book moves in UCI, played before the bots take over.
+    opening: Tuple[str, ...]
+    think_time: float
+    max_plies: int
+    # Book the minmax bot answers from during the game; None to always search.
+    minmax_book: Optional[str]
+
+
+# A random walk through the book, weighted like book_move, reproducible from rng.
+def book_opening(reader: Optional[chess.polyglot.MemoryMappedReader], rng: random.Random, plies: int) -> List[str]:
+    board = chess.Board()
+    moves = []
+    while reader is not None and len(moves) < plies:
+        try:
+            move = reader.weighted_choice(board, random=rng).move
+        except IndexError:
+            break
+        moves.append(move.uci())
+        board.push(move)
+    return moves
+
+
+# Every pair of bots in turn, each opening played twice with the colours swapped, so
+# neither the book nor the first move favours one side.
+def schedule(bots: List[str], games: int, reader, book_plies: int, think_time: float, max_plies: int,
+             seed: int, minmax_book: Optional[str] = None) -> Iterator[Task]:
+    pairs = list(itertools.combinations(bots, 2))
+    for index in range(games):
+        first, second = pairs[index // 2 % len(pairs)]
+        white, black = (first, second) if index % 2 == 0 else (second, first)
+        opening = book_opening(reader, random.Random(f"{seed}:{index // 2}"), book_plies)
+        yield Task(index, white, black, tuple(opening), think_time, max_plies, minmax_book)
+
+
+def bot_reply(bot_type: str, board: chess.Board, limit: chess.engine.Limit, game: int,
+              minmax_book: Optional[str] = None) -> chess.Move:
+    if bot_type == "minmax":
+        # Bypass the position cache: a reply remembered from an earlier game would take no
+        # time and skew the move times and the rating.
+        return minmax_move(board, limit, minmax_book, cache=False).move
+    with get_pool(BOT_ENGINE_PATHS[bot_type]).engine() as engine:
+        return engine.play(board, limit, game=game).move
+
+
+# Runs in a worker process, which keeps its engines and minmax tables between games.
+def play_game(task: Task) -> Tuple[dict, str]:
+    started = time.perf_counter()
+    board = chess.Board()
+    for uci in task.opening:
+        board.push_uci(uci)
+    limit = chess.engine.Limit(time=task.think_time)
+    spent = {chess.WHITE: 0.0, chess.BLACK: 0.0}
+    moves = {chess.WHITE: 0, chess.BLACK: 0}
+    result = termination = None
+    while not board.is_game_over(claim_draw=True) and len(board.move_stack) < task.max_plies:
+        mover = board.turn
+        move_started = time.perf_counter()
+        move = bot_reply(task.white if mover == chess.WHITE else task.black, board, limit, task.index,
+                         task.minmax_book)
+        spent[mover] += time.perf_counter() - move_started
+        moves[mover] += 1
+        if not board.is_legal(move):
+            result, termination = ("0-1" if mover == chess.WHITE else "1-0"), "illegal_move"
+            break
+        board.push(move)
+    if result is None:
+        outcome = board.outcome(claim_draw=True)
+        if outcome is not None:
+            result, termination = outcome.result(), outcome.termination.name.lower()
+        else:
+            result, termination = "1/2-1/2", "max_plies"
+
+    row = {
+        "index": task.index,
+        "white": task.white,
+        "black": task.black,
+        "result": result,
+        "termination": termination,
+        "plies": len(board.move_stack),
+        "opening": " ".join(task.opening),
+        "white_time": round(spent[chess.WHITE], 6),
+        "white_moves": moves[chess.WHITE],
+        "black_time": round(spent[chess.BLACK], 6),
+        "black_moves": moves[chess.BLACK],
+        "seconds": round(time.perf_counter() - started, 6),
+    }
+    game = chess.pgn.Game.from_board(board)
+    game.headers["Event"] = "PyChess tournament"
+    game.headers["Site"] = "PyChess"
+    game.headers["Date"] = time.strftime("%Y.%m.%d")
+    game.headers["Round"] = str(task.index + 1)
+    game.headers["White"] = BOT_NAMES[task.white].strip()
+    game.headers["Black"] = BOT_NAMES[task.black].strip()
+    game.headers["Result"] = result
+    game.headers["Termination"] = termination
+    game.headers["TimeControl"] = f"{task.think_time}s/move"
+    game.headers["Opening"] = " ".join(task.opening) or "-"
+    return row, game.accept(chess.pgn.StringExporter(columns=80)) + "\n\n"
+
+
+def read_checkpoint(path: str) -> List[dict]:
+    if not os.path.exists(path):
+        return []
+    with open(path, newline="") as handle:
+        return list(csv.DictReader(handle))
+
+
+def score_of(result: str, white: bool) -> float:
+    if result == "1/2-1/2":
+        return 0.5
+    return 1.0 if (result == "1-0") == white else 0.0
+
+
+def elo_difference(score: float) -> float:
+    if score <= 0.0:
+        return -math.inf
+    if score >= 1.0:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+# Elo difference for a wins/draws/losses record, with the bounds of its 95% interval
+# from the spread of the per-game scores.
+def elo_estimate(wins: int, draws: int, losses: int) -> Tuple[float, float, float]:
+    games = wins + draws + losses
+    if not games:
+        return 0.0, -math.inf, math.inf
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = Z_95 * math.sqrt(variance / games)
+    return elo_difference(score), elo_difference(score - margin), elo_difference(score + margin)
+
+
+def format_elo(elo: float, low: float, high: float) -> str:
+    if math.isinf(elo):
+        return f"{elo:+}"
+    if math.isinf(low) or math.isinf(high):
+        return f"{elo:+.0f} (bounds open)"
+    return f"{elo:+.0f} ±{(high - low) / 2:.0f}"
+
+
+def report(rows: List[dict], bots: List[str], played: int, elapsed: float) -> None:
+    records = {bot: [0, 0, 0] for bot in bots}
+    pairs: Dict[Tuple[str, str], List[int]] = {}
+    think = {bot: [0.0, 0] for bot in bots}
+    for row in rows:
+        white, black = row["white"], row["black"]
+        if white not in records or black not in records:
+            continue
+        score = score_of(row["result"], True)
+        outcome = 0 if score == 1.0 else 1 if score == 0.5 else 2
+        records[white][outcome] += 1
+        records[black][2 - outcome] += 1
+        first, second = sorted((white, black), key=bots.index)
+        pair = pairs.setdefault((first, second), [0, 0, 0])
+        pair[outcome if first == white else 2 - outcome] += 1
+        think[white][0] += float(row["white_time"])
+        think[white][1] += int(row["white_moves"])
+        think[black][0] += float(row["black_time"])
+        think[black][1] += int(row["black_moves"])
+
+    print(f"\n{len(rows)} games in total, {played} this run in {elapsed:.1f}s "
+          f"({played / elapsed if elapsed > 0 else 0.0:.2f} games/s)")
+    print(f"\n{'bot':<10} {'games':>6} {'W':>5} {'D':>5} {'L':>5} {'score':>7} {'ms/move':>8}  Elo vs field")
+    for bot in bots:
+        wins, draws, losses = records[bot]
+        games = wins + draws + losses
+        if not games:
+            continue
+        seconds, count = think[bot]
+        print(f"{bot:<10} {games:>6} {wins:>5} {draws:>5} {losses:>5} {(wins + draws / 2) / games:>7.1%} "
+              f"{seconds / count * 1000 if count else 0.0:>8.1f}  {format_elo(*elo_estimate(wins, draws, losses))}")
+    print(f"\n{'pairing':<22} {'W-D-L':>13}  Elo difference")
+    for (first, second), (wins, draws, losses) in pairs.items():
+        print(f"{first + ' vs ' + second:<22} {f'{wins}-{draws}-{losses}':>13}  "
+              f"{format_elo(*elo_estimate(wins, draws, losses))}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Headless bot-vs-bot tournament with Elo estimates.")
+    parser.add_argument("--bots", default="minmax,stockfish",
+                        help=f"comma-separated bots, at least two of {', '.join(TOURNAMENT_BOT_TYPES)}")
+    parser.add_argument("--games", type=int, default=100, help="total games, spread over all pairings")
+    parser.add_argument("--time", type=float, default=0.1, help="think time per move in seconds")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 2, help="games played at once")
+    parser.add_argument("--book", default=DEFAULT_BOOK, help="polyglot book for the openings; 'none' for the start position")
+    parser.add_argument("--book-plies", type=int, default=8, help="opening plies taken from the book")
+    parser.add_argument("--minmax-book", default="none",
+                        help="polyglot book the minmax bot plays from after the opening; 'none' to always search")
+    parser.add_argument("--max-plies", type=int, default=400, help="adjudicate a draw after this many plies")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the opening choice")
+    parser.add_argument("--pgn", default="tournament.pgn")
+    parser.add_argument("--csv", default="tournament.csv", help="results, also read back by --resume")
+    parser.add_argument("--resume", action="store_true", help="skip the games already in --csv")
+    args = parser.parse_args()
+
+    bots = [bot.strip().lower() for bot in args.bots.split(",") if bot.strip()]
+    unknown = [bot for bot in bots if bot not in TOURNAMENT_BOT_TYPES]
+    if unknown or len(set(bots)) < 2:
+        sys.exit(f"Need at least two different bots of {', '.join(TOURNAMENT_BOT_TYPES)}; got {args.bots!r}.")
+    for bot in bots:
+        if bot != "minmax" and not os.path.exists(BOT_ENGINE_PATHS[bot]):
+            sys.exit(f"Engine for {bot} not found at {BOT_ENGINE_PATHS[bot]}.")
+    reader = None
+    if args.book.lower() != "none":
+        reader = open_book(args.book)
+        if reader is None:
+            sys.exit(f"Opening book {book_path(args.book)} not found; pass --book or --book none.")
+    minmax_book = None
+    if args.minmax_book.lower() != "none":
+        if open_book(args.minmax_book) is None:
+            sys.exit(f"Opening book {book_path(args.minmax_book)} not found; pass --minmax-book or --minmax-book none.")
+        minmax_book = args.minmax_book
+
+    rows = read_checkpoint(args.csv)
+    if rows and not args.resume:
+        sys.exit(f"{args.csv} already holds {len(rows)} games; pass --resume to continue it or choose another file.")
+    done = {int(row["index"]) for row in rows}
+    tasks = iter([task for task in schedule(bots, args.games, reader, args.book_plies, args.time, args.max_plies,
+                                            args.seed, minmax_book) if task.index not in done])
+    remaining = args.games - len(done & set(range(args.games)))
+    print(f"{remaining} of {args.games} games to play on {args.processes} processes"
+          + (f", {len(done)} already in {args.csv}" if done else ""))
+
+    processes = max(1, args.processes)
+    # Spawned like the search workers: each worker imports the bots and opens its own engines.
+    executor = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+    started = time.monotonic()
+    played = failed = 0
+    pending = {}
+    with open(args.csv, "a", newline="") as csv_handle, open(args.pgn, "a") as pgn_handle:
+        writer = csv.DictWriter(csv_handle, CSV_FIELDS)
+        if not rows:
+            writer.writeheader()
+        try:
+            while True:
+                # Two games queued per process, so a worker never waits for the next one.
+                while len(pending) < processes * 2:
+                    task = next(tasks, None)
+                    if task is None:
+                        break
+                    pending[executor.submit(play_game, task)] = task
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    task = pending.pop(future)
+                    try:
+                        row, pgn = future.result()
+                    except Exception as e:
+                        # Left out of the checkpoint, so --resume plays it again.
+                        failed += 1
+                        print(f"  game {task.index + 1} ({task.white} vs {task.black}) failed: {e}", file=sys.stderr)
+                        continue
+                    # PGN first: an interrupted write leaves at worst a game the CSV doesn't know.
+                    pgn_handle.write(pgn)
+                    pgn_handle.flush()
+                    writer.writerow(row)
+                    csv_handle.flush()
+                    rows.append({key: str(value) for key, value in row.items()})
+                    played += 1
+                    print(f"[{len(done) + played}/{args.games}] {task.white} - {task.black} {row['result']} "
+                          f"({row['termination']}, {row['plies']} plies)")
+        except KeyboardInterrupt:
+            print(f"\nInterrupted; rerun with --resume to play the {remaining - played} games left.")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    if failed:
+        print(f"{failed} games failed and were not recorded; --resume retries them.")
+    report(rows, bots, played, time.monotonic() - started)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+from typing import List, NamedTuple, Optional
+
+import chess
+
+
+EXACT = 0
+LOWERBOUND = 1
+UPPERBOUND = 2
+
+TT_SIZE_MB = int(os.environ.get("PYCHESS_TT_SIZE_MB", "32"))
+
+# Approximate footprint of one stored entry on CPython: the tuple, its ints,
+# the chess.Move it references and the slot in the backing list.
+ENTRY_BYTES = 320
+
+
+class TTEntry(NamedTuple):
+    key: int
+    depth: int
+    score: int
+    bound: int
+    move: Optional[chess.Move]
+    generation: int
+
+
+class TranspositionTable:
+    def __init__(self, size_mb: int = TT_SIZE_MB):
+        self.slots = max(1, size_mb * 1024 * 1024 // ENTRY_BYTES)
+        self._table: List[Optional[TTEntry]] = [None] * self.slots
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.used = 0
+
+    def new_search(self) -> None:
+        self.generation += 1
+
+    def probe(self, key: int) -> Optional[TTEntry]:
+        self.probes += 1
+        entry = self._table[key % self.slots]
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+        return None
+
+    def store(self, key: int, depth: int, score: int, bound: int, move: Optional[chess.Move]) -> None:
+        index = key % self.slots
+        old = self._table[index]
+        if old is None:
+            self.used += 1
+        elif old.generation == self.generation and old.depth > depth:
+            # Depth-preferred within a search: a shallower result never evicts a
+            # deeper one, but entries left over from earlier searches always age out.
+            return
+        self._table[index] = TTEntry(key, depth, score, bound, move, self.generation)
+        self.stores += 1
+
+    def clear(self) -> None:
+        self._table = [None] * self.slots
+        self.used = 0
+
+    def stats(self) -> dict:
+        return {
+            "slots": self.slots,
+            "used": self.used,
+            "probes": self.probes,
+            "hits": self.hits,
+            "stores": self.stores,
+            "hit_rate": self.hits / self.probes if self.probes else 0.0,
+        }